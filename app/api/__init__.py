@@ -1,2 +1,2 @@
 from .v1 import router as v1_router
-
+from .metrics import router as metrics_router
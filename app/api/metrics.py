@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends, Request, Response, status
+from app.core import limiter, render_metrics, require_internal_client
+
+router = APIRouter(tags=["metrics"])
+
+
+# prometheus scrape target, kept out of the versioned api and the docs.
+# internal only (routes, latencies, lockout counts): scrape with the X-Internal-Client-Secret
+# header (prometheus `http_headers`), 404 while INTERNAL_CLIENT_SECRET is unset.
+# sync on purpose: multiprocess mode reads every worker's files, that runs in the threadpool
+
+@router.get("/metrics", status_code=status.HTTP_200_OK, include_in_schema=False, dependencies=[Depends(require_internal_client)])
+@limiter.exempt
+def metrics(request: Request):
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
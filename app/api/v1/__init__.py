@@ -1,10 +1,16 @@
 from fastapi import APIRouter
+from app.core import get_settings
 from .health import router as health_router
 from .users import router as users_router
 from .auth import router as auth_router
+from .jwks import router as jwks_router
+from .debug import router as debug_router
 
 router = APIRouter(prefix="/v1")
 
 router.include_router(health_router)
 router.include_router(auth_router)
-router.include_router(users_router)
\ No newline at end of file
+router.include_router(users_router)
+router.include_router(jwks_router)
+if get_settings().PROFILING_ENABLED:
+    router.include_router(debug_router)
\ No newline at end of file
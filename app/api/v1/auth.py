@@ -4,11 +4,16 @@ from typing import Annotated
 from datetime import timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, or_, update
+from pydantic import NameEmail
+from jwt import InvalidTokenError
 
-from app.core import get_settings, limiter, get_current_user, create_access_token, verify_password, hash_password
+from app.core import get_settings, limiter, get_current_user, create_access_token, verify_password_async, verify_and_update_password_async, hash_password_async, get_cache_manager, CacheRedisManager, invalidate_principal, resolve_principal, resolve_principals, get_refresh_manager, RefreshTokenRedisManager, RefreshTokenReuseError, verify_token_cached, require_internal_client, get_otp_manager, OTPRedisManager, get_email_outbox_manager, EmailOutboxRedisManager, get_login_guard_manager, LoginGuardRedisManager, LoginLockedOut, get_forwarded_address
+from app.core.metrics import LOGIN_LOCKOUTS
 from app.db import get_db
 from app.models import User
-from app.schemas import Token, NewPswdPayload, ApiResponse
+from app.schemas import Token, TokenPayload, NewPswdPayload, ApiResponse, Principal, RefreshTokenRequest, IntrospectionRequest, IntrospectionResult, IntrospectionResponse, OTPLoginRequest, OTPLoginVerify
+from app.services import enqueue_otp_email
+from app.utils import generate_otp, hash_otp, otp_verification_error
 
 
 router = APIRouter(prefix="/auth", tags=["health"])
@@ -21,7 +26,9 @@ async def login_for_access_token(
     request: Request,
     response: Response,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Annotated[AsyncSession, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_db)],
+    refresh_tokens: Annotated[RefreshTokenRedisManager, Depends(get_refresh_manager)],
+    login_guard: Annotated[LoginGuardRedisManager, Depends(get_login_guard_manager)]
 ) -> ApiResponse[Token]:
 
     result = await db.execute(
@@ -34,32 +41,248 @@ async def login_for_access_token(
     )
     user = result.scalars().first()
 
+    # failures are counted per user id (username and email share the budget),
+    # unknown names by the name itself so they look the same from outside
+    account = str(user.id) if user else form_data.username.lower()
+    ip = get_forwarded_address(request)
+
+    # attacked account / ip: reject with one redis call, before argon2 runs
+    try:
+        locked_for = await login_guard.check(account, ip)
+    except Exception as e:
+        print(f"Login guard unavailable, skipping lockout check: {e!r}")
+        locked_for = 0
+    if locked_for:
+        LOGIN_LOCKOUTS.inc()
+        raise LoginLockedOut(retry_after=locked_for)
+
     # verify user exists and password is correct
     # don't reveal which one failed
 
-    if not user or not verify_password(form_data.password, user.password_hash):
+    verified, updated_hash = (await verify_and_update_password_async(form_data.password, user.password_hash)) if user else (False, None)
+    if not verified:
+        try:
+            failure = await login_guard.record_failure(account, ip)
+        except Exception as e:
+            print(f"Login guard unavailable, failure not counted: {e!r}")
+        else:
+            if failure.retry_after:
+                LOGIN_LOCKOUTS.inc()
+                raise LoginLockedOut(retry_after=failure.retry_after)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Incorrect email or password",
                             headers={"WWW-Authenticate": "Bearer"})
 
+    try:
+        await login_guard.record_success(account, ip)
+    except Exception:
+        pass  # counters expire on their own
+
+    # stored hash was made with older argon2 parameters, upgrade it transparently
+    if updated_hash:
+        user.password_hash = updated_hash
+
     # create access token with user id as subject
     access_token_expires = timedelta(minutes=settings.TOKEN_EXPIRE_MIN)
     access_token = create_access_token(
         data={"sub": str(user.id), "token_version": user.token_version},
         expires_delta=access_token_expires
     )
-    return ApiResponse(success=True, data=Token(access_token=access_token, token_type="bearer"))
+    refresh_token = await refresh_tokens.issue(user_id=str(user.id), token_version=user.token_version)
+    return ApiResponse(success=True, data=Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token))
+
+
+@router.post("/otp-login/request", response_model=ApiResponse[None], response_model_exclude_none=True, status_code=status.HTTP_200_OK)
+@limiter.limit("5/minute")
+async def request_login_otp(
+    request: Request,
+    response: Response,
+    payload: OTPLoginRequest,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    redis: Annotated[OTPRedisManager, Depends(get_otp_manager)],
+    outbox: Annotated[EmailOutboxRedisManager, Depends(get_email_outbox_manager)]
+) -> ApiResponse[None]:
+    """Mail a one time login code. The answer is the same whether or not the account exists."""
+    email = payload.email.lower()
+    result = await db.execute(select(User.first_name).where(User.email == email, User.is_active.is_(True)))
+    row = result.first()
+
+    if row is not None:
+        otp = generate_otp()
+        issued = await redis.issue_otp(email=email, hashed_otp=hash_otp(otp=otp), key_prefix=settings.OTP_KEY_LOGIN)
+        # a code is already pending / address locked out: nothing new to send
+        if issued.issued:
+            try:
+                await enqueue_otp_email(outbox, NameEmail(name=row.first_name.capitalize() if row.first_name else "User", email=email), otp)
+            except Exception:
+                await redis.delete_otp(email=email, key_prefix=settings.OTP_KEY_LOGIN)
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Error sending email"
+                )
+
+    return ApiResponse(success=True, message="If the account exists, a login code was sent to the email")
+
+
+@router.post("/otp-login", response_model=ApiResponse[Token], status_code=status.HTTP_200_OK, response_model_exclude_none=True)
+@limiter.limit("10/minute")
+async def login_with_otp(
+    request: Request,
+    response: Response,
+    payload: OTPLoginVerify,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    redis: Annotated[OTPRedisManager, Depends(get_otp_manager)],
+    refresh_tokens: Annotated[RefreshTokenRedisManager, Depends(get_refresh_manager)]
+) -> ApiResponse[Token]:
+    """Passwordless login: hmac compare + one redis call instead of an argon2 verify"""
+    email = payload.email.lower()
+    verified = await redis.verify_otp(email=email, key_prefix=settings.OTP_KEY_LOGIN, hashed_otp=hash_otp(payload.otp))
+    if not verified.ok:
+        raise otp_verification_error(verified, status_code=status.HTTP_401_UNAUTHORIZED)
+
+    result = await db.execute(select(User.id, User.token_version, User.is_active).where(User.email == email))
+    user = result.first()
+    if user is None or not user.is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="OTP expired or not requested",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+    access_token = create_access_token(
+        data={"sub": str(user.id), "token_version": user.token_version},
+        expires_delta=timedelta(minutes=settings.TOKEN_EXPIRE_MIN)
+    )
+    refresh_token = await refresh_tokens.issue(user_id=str(user.id), token_version=user.token_version)
+    return ApiResponse(success=True, data=Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token))
+
+
+@router.post("/refresh", response_model=ApiResponse[Token], status_code=status.HTTP_200_OK, response_model_exclude_none=True)
+@limiter.limit("30/minute")
+async def refresh_access_token(
+    request: Request,
+    response: Response,
+    payload: RefreshTokenRequest,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    cache: Annotated[CacheRedisManager, Depends(get_cache_manager)],
+    refresh_tokens: Annotated[RefreshTokenRedisManager, Depends(get_refresh_manager)]
+) -> ApiResponse[Token]:
+    """Rotate a refresh token, costs a redis round trip instead of an argon2 verify"""
+    invalid_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                      detail="Invalid or expired refresh token",
+                                      headers={"WWW-Authenticate": "Bearer"})
+    try:
+        rotated = await refresh_tokens.rotate(payload.refresh_token)
+    except RefreshTokenReuseError:
+        # a stolen token was replayed (or the client raced itself), the family is revoked
+        raise invalid_exception
+    if rotated is None:
+        raise invalid_exception
+
+    user_id, token_version, next_refresh_token = rotated
+
+    user = await resolve_principal(db, cache, user_id, token_version)
+
+    # password change / logout everywhere bumps token_version and kills the family
+    if not user or not user.is_active or user.token_version != token_version:
+        await refresh_tokens.revoke_family(next_refresh_token)
+        raise invalid_exception
+
+    access_token = create_access_token(
+        data={"sub": user_id, "token_version": token_version},
+        expires_delta=timedelta(minutes=settings.TOKEN_EXPIRE_MIN)
+    )
+    return ApiResponse(success=True, data=Token(access_token=access_token, token_type="bearer", refresh_token=next_refresh_token))
 
 
 @router.patch("/password", status_code=status.HTTP_204_NO_CONTENT)
 @limiter.limit("5/minute")
-async def change_password(request: Request, response: Response, pswd_payload: NewPswdPayload, current_user: Annotated[User, Depends(get_current_user)], db: Annotated[AsyncSession, Depends(get_db)]):
+async def change_password(request: Request, response: Response, pswd_payload: NewPswdPayload, current_user: Annotated[Principal, Depends(get_current_user)], db: Annotated[AsyncSession, Depends(get_db)], cache: Annotated[CacheRedisManager, Depends(get_cache_manager)]):
     """Change user password"""
-    if not verify_password(pswd_payload.current_password, current_user.password_hash):
+    # the cached principal never carries the hash, read it from the db
+    password_hash = await db.scalar(select(User.password_hash).where(User.id == current_user.id))
+    if not password_hash or not await verify_password_async(pswd_payload.current_password, password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Incorrect password try again",
                             headers={"WWW-Authenticate": "Bearer"})
 
-    stmt = update(User).where(User.id == current_user.id).values(password_hash=hash_password(
-        pswd_payload.new_password), token_version=User.token_version + 1)
+    new_password_hash = await hash_password_async(pswd_payload.new_password)
+    stmt = update(User).where(User.id == current_user.id).values(
+        password_hash=new_password_hash, token_version=User.token_version + 1)
     await db.execute(stmt)
+
+    # commit before dropping the cached principal so a concurrent request
+    # can't re-cache the old token_version
+    await db.commit()
+    await invalidate_principal(cache, str(current_user.id))
+
+
+@router.post("/introspect", response_model=ApiResponse[IntrospectionResponse], status_code=status.HTTP_200_OK, response_model_exclude_none=True, dependencies=[Depends(require_internal_client)])
+@limiter.exempt
+async def introspect_tokens(
+    request: Request,
+    response: Response,
+    payload: IntrospectionRequest,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    cache: Annotated[CacheRedisManager, Depends(get_cache_manager)]
+) -> ApiResponse[IntrospectionResponse]:
+    """Batch token introspection for internal services, one call instead of one per token"""
+    parsed: list[TokenPayload | None] = []
+    wanted: dict[str, int] = {}
+    for token in payload.tokens:
+        try:
+            token_payload = verify_token_cached(token)
+        except (InvalidTokenError, TypeError, ValueError):
+            parsed.append(None)
+            continue
+        parsed.append(token_payload)
+        wanted[token_payload.sub] = token_payload.token_version
+
+    # every referenced user in one batch (L1, one MGET, one IN query)
+    principals = await resolve_principals(db, cache, wanted) if wanted else {}
+
+    results = []
+    for token_payload in parsed:
+        principal = principals.get(token_payload.sub) if token_payload else None
+        if (
+            token_payload is None
+            or principal is None
+            or not principal.is_active
+            or principal.token_version != token_payload.token_version
+        ):
+            results.append(IntrospectionResult(active=False))
+            continue
+
+        results.append(IntrospectionResult(
+            active=True,
+            sub=token_payload.sub,
+            username=principal.username,
+            exp=token_payload.exp,
+            token_type="access_token",
+            role=principal.role,
+            is_verified=principal.is_verified,
+        ))
+
+    return ApiResponse(success=True, data=IntrospectionResponse(results=results))
+
+
+@router.api_route("/verify", methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"], status_code=status.HTTP_200_OK, include_in_schema=False)
+@limiter.exempt
+async def forward_auth(request: Request, current_user: Annotated[Principal, Depends(get_current_user)]) -> Response:
+    """
+    Forward-auth for reverse proxies: 200 + identity headers, empty body.
+    Token and principal lookups are cached, so the hot path has no db hit and no json.
+
+    Allow decisions are `public, max-age=FORWARD_AUTH_CACHE_SECONDS` so a shared
+    proxy cache stores them. The proxy's cache key MUST contain the token, e.g.
+    nginx `proxy_cache_key $http_authorization;` on the auth_request location,
+    otherwise one user's decision is served to another. Denials are never cached.
+    """
+    return Response(
+        status_code=status.HTTP_200_OK,
+        headers={
+            "X-Auth-User-Id": str(current_user.id),
+            "X-Auth-User-Role": current_user.role.value,
+            "X-Auth-User-Verified": "true" if current_user.is_verified else "false",
+            "Cache-Control": f"public, max-age={settings.FORWARD_AUTH_CACHE_SECONDS}",
+            "Vary": "Authorization",
+        }
+    )
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from typing import Annotated, Any
+
+from app.core import limiter, require_internal_client
+from app.core.profiler import start_tracemalloc, stop_tracemalloc, tracemalloc_status, tracemalloc_snapshot
+
+# per worker process: behind a load balancer each call lands on one worker (pid is in every answer)
+router = APIRouter(prefix="/debug", tags=["debug"], dependencies=[Depends(require_internal_client)], include_in_schema=False)
+
+
+@router.get("/tracemalloc", status_code=status.HTTP_200_OK)
+@limiter.exempt
+async def tracemalloc_info(request: Request) -> dict[str, Any]:
+    return tracemalloc_status()
+
+
+@router.post("/tracemalloc/start", status_code=status.HTTP_200_OK)
+@limiter.exempt
+async def tracemalloc_start(request: Request, frames: Annotated[int, Query(ge=1, le=100)] = 25) -> dict[str, Any]:
+    return start_tracemalloc(frames)
+
+
+# snapshots walk every live allocation, sync so it runs in the threadpool instead of the event loop
+@router.get("/tracemalloc/snapshot", status_code=status.HTTP_200_OK)
+@limiter.exempt
+def tracemalloc_take_snapshot(request: Request, limit: Annotated[int, Query(ge=1, le=500)] = 25) -> dict[str, Any]:
+    try:
+        return tracemalloc_snapshot(limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.post("/tracemalloc/stop", status_code=status.HTTP_200_OK)
+@limiter.exempt
+async def tracemalloc_stop(request: Request) -> dict[str, Any]:
+    return stop_tracemalloc()
@@ -1,6 +1,6 @@
 from fastapi import APIRouter , Response , Depends , status,Request
-from app.core import limiter,get_settings
-from app.schemas import HealthResponse
+from app.core import limiter,get_settings,get_hashing_stats,get_principal_cache_stats,get_token_cache_stats,get_redis_pool_stats,get_rate_limit_stats,require_internal_client
+from app.schemas import HealthResponse,HealthStatsResponse
 
 router = APIRouter(prefix="/health",tags=["health"])
 settings = get_settings()
@@ -13,6 +13,15 @@ async def liveness_check(request:Request,response:Response):
     response.status_code = status.HTTP_200_OK
     return {"status":"alive"}
 
+# load gauges used by the autoscaler (in-flight / queued password hashing)
+# and in-process cache counters / redis pool utilization / limiter redis round trips.
+# internal only: needs X-Internal-Client-Secret, 404 while INTERNAL_CLIENT_SECRET is unset
+
+@router.get("/stats",status_code=status.HTTP_200_OK,response_model=HealthStatsResponse,dependencies=[Depends(require_internal_client)])
+@limiter.exempt
+async def stats(request:Request,response:Response):
+    return {"hashing":get_hashing_stats(),"principal_cache":get_principal_cache_stats(),"token_cache":get_token_cache_stats(),"redis_pools":get_redis_pool_stats(),"rate_limit":get_rate_limit_stats()}
+
 # @router.get("/ready",status_code=status.HTTP_200_OK,response_model=HealthResponse)
 # @limiter.exempt
 # async def readiness_check(request:Request,response:Response):
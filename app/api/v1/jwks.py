@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Request, Response, status
+from app.core import limiter, get_settings, get_jwks
+
+router = APIRouter(prefix="/.well-known", tags=["auth"])
+settings = get_settings()
+
+
+# public keys for local token verification by gateways / downstream services
+# body and etag are computed once at startup, so this is a header compare + bytes write
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses the weak comparison (RFC 9110 13.1.2): a list of etags, W/ ignored, or *"""
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+@router.get("/jwks.json", status_code=status.HTTP_200_OK)
+@limiter.exempt
+async def jwks(request: Request):
+    body, etag = get_jwks()
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE_SECONDS}",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,16 +1,16 @@
-from fastapi import APIRouter, Request, Response, status, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Request, Response, status, Depends, HTTPException
 from fastapi_mail.errors import ConnectionErrors
 from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_
+from sqlalchemy import select, or_, update, delete
 from pydantic import NameEmail
 
-from app.core import get_settings, limiter, get_current_user, hash_password,get_otp_manager,OTPRedisManager
+from app.core import get_settings, limiter, get_current_user, hash_password_async,get_otp_manager,OTPRedisManager,get_cache_manager,CacheRedisManager,principal_from_user,invalidate_principal,get_email_outbox_manager,EmailOutboxRedisManager
 from app.db import get_db
 from app.models import User
-from app.services import send_otp_email
-from app.utils import generate_otp, hash_otp
-from app.schemas import UserPrivateResponse, UserCreate, UserUpdate, ApiResponse
+from app.services import enqueue_otp_email
+from app.utils import generate_otp, hash_otp, otp_verification_error
+from app.schemas import UserPrivateResponse, UserCreate, UserUpdate, ApiResponse, Principal, OTPVerifyRequest
 
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -19,7 +19,7 @@ settings = get_settings()
 
 @router.get("/me", response_model=ApiResponse[UserPrivateResponse], response_model_exclude_none=True)
 @limiter.limit("20/minute")
-async def read_me(request: Request, response: Response, current_user: Annotated[User, Depends(get_current_user)], db: Annotated[AsyncSession, Depends(get_db)]) -> ApiResponse[UserPrivateResponse]:
+async def read_me(request: Request, response: Response, current_user: Annotated[Principal, Depends(get_current_user)], db: Annotated[AsyncSession, Depends(get_db)]) -> ApiResponse[UserPrivateResponse]:
     """ get currently authenticated user. """
     """To get the users details using token."""
     print(current_user)
@@ -50,7 +50,7 @@ async def create_user(request: Request, response: Response, user: UserCreate, db
     user_data.pop("password")
     new_user = User(
         **user_data,
-        password_hash=hash_password(user.password)
+        password_hash=await hash_password_async(user.password)
     )
 
     db.add(new_user)
@@ -61,51 +61,82 @@ async def create_user(request: Request, response: Response, user: UserCreate, db
 
 @router.patch("/me", response_model=ApiResponse[UserPrivateResponse], response_model_exclude_none=True, status_code=status.HTTP_200_OK)
 @limiter.limit("20/minute")
-async def user_update(request: Request, response: Response, update_payload: UserUpdate, current_user: Annotated[User, Depends(get_current_user)], db: Annotated[AsyncSession, Depends(get_db)]) -> ApiResponse[UserPrivateResponse]:
+async def user_update(request: Request, response: Response, update_payload: UserUpdate, current_user: Annotated[Principal, Depends(get_current_user)], db: Annotated[AsyncSession, Depends(get_db)], cache: Annotated[CacheRedisManager, Depends(get_cache_manager)]) -> ApiResponse[UserPrivateResponse]:
     """Update user details"""
     update_data = update_payload.model_dump(exclude_unset=True)
 
-    for field, value in update_data.items():
-        setattr(current_user, field, value)
+    result = await db.execute(
+        update(User).where(User.id == current_user.id).values(**update_data).returning(User)
+    )
+    updated_user = result.scalars().one()
+    principal = principal_from_user(updated_user)
 
-    await db.refresh(current_user)
+    # drop the cached principal once the change is committed, the next read re-caches it
+    await db.commit()
+    await invalidate_principal(cache, str(principal.id))
 
-    return ApiResponse(success=True, message="User update successfully!", data=UserPrivateResponse.model_validate(current_user))
+    return ApiResponse(success=True, message="User update successfully!", data=UserPrivateResponse.model_validate(principal))
 
 
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
 @limiter.limit("20/minute")
-async def delete_user(request: Request, response: Response, current_user: Annotated[User, Depends(get_current_user)], db: Annotated[AsyncSession, Depends(get_db)]):
+async def delete_user(request: Request, response: Response, current_user: Annotated[Principal, Depends(get_current_user)], db: Annotated[AsyncSession, Depends(get_db)], cache: Annotated[CacheRedisManager, Depends(get_cache_manager)]):
     """Delete user"""
-    await db.delete(current_user)
+    await db.execute(delete(User).where(User.id == current_user.id))
+    await db.commit()
+    await invalidate_principal(cache, str(current_user.id))
 
 
 @router.post("/request-email-otp", response_model=ApiResponse[None], response_model_exclude_none=True, status_code=status.HTTP_200_OK)
-async def send_otp(request: Request, response: Response, background_task: BackgroundTasks, current_user: Annotated[User, Depends(get_current_user)], redis: Annotated[OTPRedisManager, Depends(get_otp_manager)]) -> ApiResponse[None]:
+async def send_otp(request: Request, response: Response, current_user: Annotated[Principal, Depends(get_current_user)], redis: Annotated[OTPRedisManager, Depends(get_otp_manager)], outbox: Annotated[EmailOutboxRedisManager, Depends(get_email_outbox_manager)]) -> ApiResponse[None]:
     """Email service functionality"""
-    ttl = await redis.get_otp_ttl(current_user.email,key_prefix=settings.OTP_KEY_VERIFY)
-    "working good "
-    if ttl is not None:
+    otp = generate_otp()
+    hashed_otp = hash_otp(otp=otp)
+
+    # check + store in one atomic step, concurrent requests can't both issue
+    issued = await redis.issue_otp(email=current_user.email, hashed_otp=hashed_otp, key_prefix=settings.OTP_KEY_VERIFY)
+    if not issued.issued:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"OTP already send. Please wait {ttl} seconds before requesting again.",
-            headers={"Retry-After": str(ttl)}
+            detail="Too many wrong codes. Please try again later." if issued.locked
+            else f"OTP already send. Please wait {issued.ttl} seconds before requesting again.",
+            headers={"Retry-After": str(issued.ttl)}
         )
 
-    otp = generate_otp()
-    hashed_otp = hash_otp(otp=otp)
     try:
         email: NameEmail = NameEmail(name=current_user.first_name.capitalize(
         ) if current_user.first_name else "User", email=current_user.email)
 
-        # save the hashed otp
-        await redis.set_otp(email=email.email, hashed_otp=hashed_otp,key_prefix=settings.OTP_KEY_VERIFY)
-
-        background_task.add_task(send_otp_email, email, otp)
+        # delivery happens in the email worker, the request only pays for one XADD
+        await enqueue_otp_email(outbox, email, otp)
 
         return ApiResponse(success=True, message="OTP sent succesfully check email!")
     except (ConnectionErrors, Exception) as e:
+        # otp was never queued, let the user ask again right away
+        await redis.delete_otp(email=current_user.email, key_prefix=settings.OTP_KEY_VERIFY)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error sending email"
         )
+
+
+@router.post("/verify-email", response_model=ApiResponse[UserPrivateResponse], response_model_exclude_none=True, status_code=status.HTTP_200_OK)
+@limiter.limit("10/minute")
+async def verify_email(request: Request, response: Response, payload: OTPVerifyRequest, current_user: Annotated[Principal, Depends(get_current_user)], db: Annotated[AsyncSession, Depends(get_db)], redis: Annotated[OTPRedisManager, Depends(get_otp_manager)], cache: Annotated[CacheRedisManager, Depends(get_cache_manager)]) -> ApiResponse[UserPrivateResponse]:
+    """Consume the email otp and mark the user verified (hmac + one redis call, no argon2)"""
+    if current_user.is_verified:
+        return ApiResponse(success=True, message="Email already verified", data=UserPrivateResponse.model_validate(current_user))
+
+    result = await redis.verify_otp(email=current_user.email, key_prefix=settings.OTP_KEY_VERIFY, hashed_otp=hash_otp(payload.otp))
+    if not result.ok:
+        raise otp_verification_error(result)
+
+    updated = await db.execute(
+        update(User).where(User.id == current_user.id).values(is_verified=True).returning(User)
+    )
+    principal = principal_from_user(updated.scalars().one())
+
+    await db.commit()
+    await invalidate_principal(cache, str(principal.id))
+
+    return ApiResponse(success=True, message="Email verified successfully!", data=UserPrivateResponse.model_validate(principal))
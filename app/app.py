@@ -2,14 +2,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
 from contextlib import asynccontextmanager
 
-# from slowapi import _rate_limit_exceeded_handler
-from app.core import get_settings, limiter, AppException, get_redis_manager
+from app.core import get_settings, limiter, RateLimitExceeded, RateLimitMiddleware, AppException, get_redis_manager, shutdown_password_executor, PrincipalInvalidationListener, mark_worker_dead, setup_tracing, shutdown_tracing
 from app.exception_handler import app_exception_handler, http_exception_handler, validation_exception_handler, rate_limit_exceeded_handler, unhandled_exception_handler
-from app.api import v1_router
+from app.api import v1_router, metrics_router
+from app.middleware import MetricsMiddleware, ProfilingMiddleware, TracingMiddleware
 
 
 @asynccontextmanager
@@ -18,10 +16,16 @@ async def lifespan(app: FastAPI):
     print("Application starting up...")
     await get_redis_manager().init()
     print("Redis started")
+    invalidation_listener = PrincipalInvalidationListener(get_redis_manager().cache)
+    invalidation_listener.start()
     yield
     # Shutdown
+    await invalidation_listener.stop()
     print("Redis closed")
     await get_redis_manager().close()
+    shutdown_password_executor()
+    mark_worker_dead()
+    shutdown_tracing()
     print("Application shuting down...")
 
 
@@ -50,17 +54,16 @@ def create_app() -> FastAPI:
         lifespan=lifespan
     )
 
-    # setting limiter
-    app.state.limiter = limiter
-
     # routers
     app.include_router(v1_router, prefix=settings.API_PREFIX)
+    if settings.METRICS_ENABLED:
+        app.include_router(metrics_router)
 
     # exception handler
     register_exception_handlers(app=app)
 
     # middleware
-    app.add_middleware(SlowAPIMiddleware)
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)  # default limits for undecorated routes
     app.add_middleware(
         CORSMiddleware,
         allow_origins=settings.CORS_ALLOW_ORIGINS,
@@ -69,6 +72,13 @@ def create_app() -> FastAPI:
         allow_headers=settings.CORS_ALLOW_HEADERS,
         max_age=3600
     )  # register last but will run first when request comes in
+    if settings.PROFILING_ENABLED:
+        app.add_middleware(ProfilingMiddleware)  # samples the whole request incl. the inner middlewares
+    if settings.TRACING_ENABLED:
+        setup_tracing()
+        app.add_middleware(TracingMiddleware)  # server span, parent of the db / redis / hashing / jwt spans
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)  # outermost, times everything incl. cors / rate limit rejections
 
     return app
 
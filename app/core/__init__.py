@@ -1,6 +1,9 @@
 from .config import get_settings
-from .global_error import AppException,ResourceNotFoundError,DatabaseError,BusinessRuleViolation
-from .rate_limiter import limiter
-from .security import decode_access_token,create_access_token,hash_password,verify_password
-from .dependencies import get_current_user
-from .redis import get_redis_manager,get_otp_manager,get_cache_manager,OTPRedisManager,RedisManager,CacheRedisManager
+from .global_error import AppException,ResourceNotFoundError,DatabaseError,BusinessRuleViolation,ServiceOverloaded,LoginLockedOut
+from .metrics import render_metrics,metrics_registry,mark_worker_dead
+from .tracing import setup_tracing,shutdown_tracing,traced,traced_from,inject_context
+from .security import decode_access_token,create_access_token,get_jwks,keyring,LEGACY_KID,legacy_seconds_left,hash_password,verify_password,hash_password_async,verify_password_async,verify_and_update_password_async,shutdown_password_executor,get_hashing_stats
+from .redis import get_redis_manager,get_otp_manager,get_cache_manager,get_refresh_manager,get_email_outbox_manager,OTPRedisManager,RedisManager,CacheRedisManager,RefreshTokenRedisManager,RefreshTokenReuseError,EmailOutboxRedisManager,OTPIssueResult,OTPVerifyResult,get_redis_pool_stats,get_rate_limit_manager,RateLimitRedisManager,get_login_guard_manager,LoginGuardRedisManager,LoginFailureResult
+from .principal_cache import principal_from_user,load_principal,get_cached_principal,cache_principal,resolve_principal,resolve_principals,invalidate_principal,get_principal_cache_stats,PrincipalInvalidationListener
+from .dependencies import get_current_user,get_current_token,require_internal_client,verify_token_cached,get_token_cache_stats,get_request_token_payload
+from .rate_limiter import limiter,RateLimitExceeded,RateLimitMiddleware,get_rate_limit_stats,get_remote_address,get_forwarded_address,get_user_or_address
@@ -1,7 +1,9 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, ValidationError, SecretStr, EmailStr
 from functools import lru_cache
-from typing import List, Optional
+from datetime import datetime
+from ipaddress import IPv4Network, IPv6Network, ip_network
+from typing import List, Optional, Literal
 
 
 class Settings(BaseSettings):
@@ -38,18 +40,93 @@ class Settings(BaseSettings):
     REDIS_PORT: str = Field(..., description="Redis port")
     REDIS_DB_RATE_LIMIT:int = Field(default=0, description="Logical seperation for storing rate limiting keys")
     REDIS_DB_OTP:int = Field(default=1, description="For storing hashed otp")
+    REDIS_DB_CACHE:int = Field(default=2, description="For cached principals")
+    REDIS_DB_REFRESH:int = Field(default=3, description="For storing hashed refresh token state")
+    REDIS_DB_QUEUE:int = Field(default=4, description="For the email outbox stream")
     #REDIS_DB: int = Field(default=0, description="Type of db")
     REDIS_PSWD: Optional[str] = None
     REDIS_USE_SSL: bool = False
 
+    # topology: a single node, a sentinel managed primary or a cluster
+    # (cluster only has db 0, the managers are kept apart by their key prefixes)
+    REDIS_MODE: Literal["standalone", "sentinel", "cluster"] = Field(default="standalone")
+    REDIS_SENTINELS: str = Field(default="", description="host:port,host:port of the sentinels")
+    REDIS_SENTINEL_MASTER: str = Field(default="mymaster", description="Sentinel service name of the primary")
+    REDIS_SENTINEL_PASSWORD: Optional[str] = Field(default=None, description="Password of the sentinels themselves")
+    REDIS_CLUSTER_NODES: str = Field(default="", description="host:port,host:port startup nodes, defaults to REDIS_HOST:REDIS_PORT")
+
+    # redis connection pools (one per logical db, shared by the managers using it)
+    REDIS_MAX_CONNECTIONS: int = Field(default=50, ge=1, description="Per pool / logical db")
+    REDIS_POOL_BLOCKING: bool = Field(default=True, description="Wait for a free connection instead of failing when the pool is full")
+    REDIS_POOL_TIMEOUT_SECONDS: float = Field(default=2.0, gt=0, description="Max wait for a free connection (blocking pool)")
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = Field(default=5.0, gt=0, description="Must stay above the blocking XREADGROUP time of the email worker")
+    REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS: float = Field(default=2.0, gt=0)
+    REDIS_SOCKET_KEEPALIVE: bool = Field(default=True)
+    REDIS_HEALTH_CHECK_INTERVAL_SECONDS: int = Field(default=30, ge=0, description="PING idle connections before reuse, 0 disables")
+
     # rate limiting
     RATE_LIMIT_DEFAULT: str
     RATE_LIMIT_ENABLED: bool
+    RATE_LIMIT_STRATEGY: Literal["redis", "hybrid"] = Field(
+        default="redis", description="hybrid: workers lease batches of tokens and count locally between redis syncs")
+    RATE_LIMIT_HYBRID_ERROR: float = Field(
+        default=0.1, gt=0, le=1, description="Fraction of a limit one worker may lease at once (limits can be hit early by up to workers x this)")
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = Field(default=100000, ge=1, description="Leases kept per worker in hybrid mode")
+    RATE_LIMIT_KEY: Literal["remote", "forwarded", "user"] = Field(
+        default="user", description="remote: peer ip, forwarded: client ip from trusted X-Forwarded-For, user: jwt sub, else forwarded ip")
+    RATE_LIMIT_TRUSTED_PROXIES: str = Field(
+        default="", description="CIDRs of our load balancers / proxies, X-Forwarded-For is only read from these, e.g. 10.0.0.0/8,172.16.0.0/12")
+
+    # password login brute force protection (checked before argon2 runs)
+    LOGIN_FAILURE_WINDOW_SECONDS: int = Field(default=900, ge=1, description="Window failed logins are counted in")
+    LOGIN_MAX_FAILURES_PER_ACCOUNT_IP: int = Field(default=5, ge=1, description="Failures from one ip before that ip is locked out of the account")
+    LOGIN_MAX_FAILURES_PER_ACCOUNT: int = Field(default=20, ge=1, description="Failures from all ips before the account is locked out for every ip it has not logged in from")
+    LOGIN_TRUSTED_IP_SECONDS: int = Field(default=30 * 24 * 3600, ge=1, description="How long an ip with a successful login bypasses the account wide lockout")
+    LOGIN_LOCKOUT_BASE_SECONDS: int = Field(default=30, ge=1, description="First lockout, doubled by every further failure")
+    LOGIN_LOCKOUT_MAX_SECONDS: int = Field(default=3600, ge=1)
 
     # auth system
     SECRET_KEY: SecretStr
-    ALGO: str = "HS256"
+    ALGO: str = Field(default="HS256", description="HS256 uses SECRET_KEY, RS256/ES256/EdDSA use JWT_PRIVATE_KEY")
+    JWT_KEY_ID: str = Field(default="primary", description="kid header of issued tokens")
+    JWT_PRIVATE_KEY: Optional[SecretStr] = Field(default=None, description="PEM private key for asymmetric ALGO")
+    JWT_PUBLIC_KEY: Optional[str] = Field(default=None, description="PEM public key, derived from the private key when omitted")
+    JWKS_MAX_AGE_SECONDS: int = Field(default=300, ge=0, description="Cache-Control max-age of the jwks document")
+    JWT_KEYRING_FILE: Optional[str] = Field(default=None, description="JSON keyring used for rotation, overrides the single key settings above")
+    JWT_KEYRING_RELOAD_SECONDS: float = Field(default=10, gt=0, description="How often the keyring file mtime is checked")
+    JWT_ACCEPT_LEGACY_UNTIL: Optional[datetime] = Field(default=None, description="Accept tokens without a kid header (HS256 + SECRET_KEY) until this time (UTC), defaults to TOKEN_EXPIRE_MIN after startup")
     TOKEN_EXPIRE_MIN: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = Field(default=14, ge=1, description="Sliding lifetime of a refresh token family")
+
+    # internal services (token introspection), endpoint is disabled when unset
+    INTERNAL_CLIENT_SECRET: Optional[SecretStr] = Field(default=None, description="Shared secret sent in X-Internal-Client-Secret")
+
+    # forward auth (nginx auth_request / envoy ext_authz)
+    FORWARD_AUTH_CACHE_SECONDS: int = Field(default=5, ge=0, description="How long a shared proxy cache may keep an allow decision, its cache key must include the Authorization header")
+
+    # verified token cache (skips signature check + claim parsing for replayed tokens)
+    TOKEN_CACHE_ENABLED: bool = True
+    TOKEN_CACHE_MAX_ENTRIES: int = Field(default=50000, ge=1)
+    TOKEN_CACHE_MAX_BYTES: int = Field(default=32*1024*1024, ge=1, description="Approximate bytes of cached tokens per worker")
+
+    # password hashing
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process"] = Field(
+        default="thread", description="Executor type used to run argon2 off the event loop")
+    PASSWORD_HASH_WORKERS: int = Field(
+        default=4, ge=1, description="Max workers in the password hashing pool")
+    PASSWORD_HASH_MAX_CONCURRENCY: Optional[int] = Field(
+        default=None, ge=1, description="Concurrent hashing jobs admitted, defaults to PASSWORD_HASH_WORKERS")
+    PASSWORD_HASH_MAX_QUEUE: int = Field(
+        default=32, ge=0, description="Requests allowed to wait for a hashing slot before shedding")
+    PASSWORD_HASH_MAX_QUEUE_SECONDS: float = Field(
+        default=2.0, gt=0, description="Max time a request waits for a hashing slot")
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = Field(
+        default=5, ge=1, description="Retry-After sent when hashing work is shed")
+
+    # argon2 cost parameters (see scripts/calibrate_argon2.py to pick them)
+    ARGON2_TIME_COST: int = Field(default=3, ge=1, description="Argon2 iterations")
+    ARGON2_MEMORY_COST: int = Field(default=65536, ge=8, description="Argon2 memory in KiB")
+    ARGON2_PARALLELISM: int = Field(default=4, ge=1, description="Argon2 lanes")
 
     # mail service
     MAIL_USERNAME: EmailStr = Field(..., description="Gmail address")
@@ -62,15 +139,68 @@ class Settings(BaseSettings):
     MAIL_STARTTLS: bool = Field(default=True)
     MAIL_SSL_TLS: bool = Field(default=False)
 
+    # smtp connection pool (long lived authenticated sessions, see email_services)
+    SMTP_POOL_SIZE: int = Field(default=5, ge=1, description="Max concurrent smtp sessions per process")
+    SMTP_POOL_MAX_IDLE_SECONDS: float = Field(
+        default=60.0, gt=0, description="Idle sessions older than this are reopened instead of reused (servers drop idle clients)")
+    SMTP_POOL_MAX_MESSAGES_PER_CONNECTION: int = Field(default=100, ge=1)
+    SMTP_TIMEOUT_SECONDS: float = Field(default=30.0, gt=0)
+
+    # email outbox (redis stream consumed by app.workers.email_worker)
+    # same {outbox} hash tag on all three so the retry script stays on one cluster slot
+    EMAIL_STREAM_KEY: str = Field(default="email:{outbox}")
+    EMAIL_RETRY_KEY: str = Field(default="email:{outbox}:retry", description="Sorted set of messages waiting for their next attempt")
+    EMAIL_DEAD_LETTER_STREAM: str = Field(default="email:{outbox}:dead")
+    EMAIL_CONSUMER_GROUP: str = Field(default="email-workers")
+    EMAIL_STREAM_MAXLEN: int = Field(default=100000, ge=1)
+    EMAIL_STREAM_MAX_AGE_SECONDS: int = Field(default=3600, ge=1, description="Unhandled outbox entries older than this are trimmed")
+    EMAIL_DEAD_LETTER_MAX_AGE_SECONDS: int = Field(default=7 * 24 * 3600, ge=1, description="Dead letters (payload secrets redacted) older than this are trimmed")
+    EMAIL_BATCH_SIZE: int = Field(default=50, ge=1, description="Messages read per XREADGROUP")
+    EMAIL_SEND_CONCURRENCY: int = Field(default=10, ge=1, description="Concurrent sends per worker")
+    EMAIL_MAX_ATTEMPTS: int = Field(default=5, ge=1)
+    EMAIL_RETRY_BASE_SECONDS: float = Field(default=2.0, gt=0)
+    EMAIL_RETRY_MAX_SECONDS: float = Field(default=300.0, gt=0)
+    EMAIL_CLAIM_IDLE_SECONDS: int = Field(default=60, ge=1, description="Pending messages idle this long are taken over from dead consumers")
+    EMAIL_STATS_LOG_SECONDS: int = Field(default=60, ge=0, description="How often the worker logs smtp pool stats (send latency, reconnects), 0 = only at shutdown")
+
     #Otp service
     OTP_TTL_SECONDS:int = Field(default=300,description="Time for otp to be stored")
     #OTP_KEY_PREFIX:str= Field(...,description="Prefix for stored key")
     OTP_KEY_VERIFY:str = Field(...,description="user verification key")
     OTP_KEY_LOGIN:str = Field(...,description="user login key")
+    OTP_MAX_ATTEMPTS:int = Field(default=5, ge=1, description="Wrong codes allowed before the address is locked out")
+    OTP_LOCKOUT_SECONDS:int = Field(default=900, ge=1, description="Lockout after too many wrong codes, also the window attempts are counted in")
 
     #Cache service
     CACHE_TTL_SECONDS:int = Field(default=3600,description="Time for cache to be stored")
     CACHE_KEY:str = Field(...,description="cache key")
+    CACHE_INVALIDATION_CHANNEL:str = Field(default="cache-invalidation",description="Pub/sub channel used to drop in-process cache entries on every worker")
+
+    #In-process (L1) principal cache in front of redis
+    PRINCIPAL_L1_ENABLED:bool = Field(default=True)
+    PRINCIPAL_L1_MAX_ENTRIES:int = Field(default=10000,ge=1,description="Max principals kept per worker")
+    PRINCIPAL_L1_MAX_BYTES:int = Field(default=8*1024*1024,ge=1,description="Max serialized bytes kept per worker")
+    PRINCIPAL_L1_TTL_SECONDS:float = Field(default=30,gt=0,description="Upper bound on staleness if an invalidation message is missed")
+    PRINCIPAL_TOMBSTONE_SECONDS:int = Field(default=10,ge=1,description="After an invalidation, reads can't re-cache a principal they loaded before the write for this long")
+
+    # prometheus (multiprocess aggregation is switched on by PROMETHEUS_MULTIPROC_DIR, see app.core.metrics)
+    METRICS_ENABLED:bool = Field(default=True,description="Serve GET /metrics (behind INTERNAL_CLIENT_SECRET) and time requests")
+    EMAIL_WORKER_METRICS_PORT:Optional[int] = Field(default=None,description="Port the email worker serves its own /metrics on, off when unset")
+
+    # on demand profiling (folded stacks for flamegraphs, see app.core.profiler)
+    PROFILING_ENABLED:bool = Field(default=False,description="Profiling middleware + /debug endpoints (behind INTERNAL_CLIENT_SECRET)")
+    PROFILING_TOKEN:Optional[SecretStr] = Field(default=None,description="A request sent with `X-Profile: <token>` is profiled")
+    PROFILING_SAMPLE_RATE:float = Field(default=0.0,ge=0,le=1,description="Fraction of all requests profiled")
+    PROFILING_INTERVAL_MS:float = Field(default=1.0,gt=0,description="Sampling interval")
+    PROFILING_MAX_CONCURRENT:int = Field(default=1,ge=1,description="Requests profiled at once per worker, others run unprofiled")
+    PROFILING_DIR:str = Field(default="/tmp/profiles",description="Where .folded files are written")
+
+    # opentelemetry tracing (see app.core.tracing)
+    TRACING_ENABLED:bool = Field(default=False)
+    TRACING_SERVICE_NAME:str = Field(default="backend-api")
+    TRACING_SAMPLE_RATIO:float = Field(default=0.1,ge=0,le=1,description="Share of new traces recorded, incoming traceparent decisions are kept")
+    TRACING_EXPORTER:Literal["file","console","none"] = Field(default="file",description="file: json lines at TRACING_FILE_PATH (collector stand-in)")
+    TRACING_FILE_PATH:str = Field(default="/tmp/traces.jsonl")
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -86,19 +216,25 @@ class Settings(BaseSettings):
             f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
         )
 
+    @staticmethod
+    def _parse_nodes(value: str) -> list[tuple[str, int]]:
+        nodes = []
+        for node in filter(None, (part.strip() for part in value.split(","))):
+            host, _, port = node.rpartition(":")
+            nodes.append((host, int(port)))
+        return nodes
+
     @property
-    def REDIS_URL(self) -> str:
-        scheme = "rediss" if self.REDIS_USE_SSL else "redis"
-        if self.REDIS_PSWD:
-            return (
-                f"{scheme}://:{self.REDIS_PSWD}"
-                f"@{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB_RATE_LIMIT}"
-            )
+    def REDIS_SENTINEL_NODES(self) -> list[tuple[str, int]]:
+        return self._parse_nodes(self.REDIS_SENTINELS)
 
-        return (
-            f"{scheme}://{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB_RATE_LIMIT}"
-        )
+    @property
+    def REDIS_CLUSTER_STARTUP_NODES(self) -> list[tuple[str, int]]:
+        return self._parse_nodes(self.REDIS_CLUSTER_NODES) or [(self.REDIS_HOST, int(self.REDIS_PORT))]
 
+    @property
+    def RATE_LIMIT_TRUSTED_PROXY_NETWORKS(self) -> list[IPv4Network | IPv6Network]:
+        return [ip_network(cidr.strip(), strict=False) for cidr in self.RATE_LIMIT_TRUSTED_PROXIES.split(",") if cidr.strip()]
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
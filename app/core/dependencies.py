@@ -1,61 +1,132 @@
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, status, Header, Request
+import jwt
 from jwt import InvalidTokenError
-from typing import Annotated
+from typing import Annotated, Optional
 from uuid import UUID
+import hashlib
+import hmac
+import time
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
-from app.core import decode_access_token
+from app.core import get_settings, decode_access_token, keyring, LEGACY_KID, legacy_seconds_left, get_cache_manager, CacheRedisManager, resolve_principal
+from app.core.local_cache import LocalTTLCache
 from app.db import get_db
-from app.models import User
-from app.schemas import TokenPayload
+from app.schemas import TokenPayload, Principal
+
+settings = get_settings()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
+# verified tokens keyed by sha256(raw token), each entry expires at the token's exp.
+# revocation is unaffected: token_version is still checked in get_current_user
+token_cache: LocalTTLCache[TokenPayload] = LocalTTLCache(
+    max_entries=settings.TOKEN_CACHE_MAX_ENTRIES,
+    max_bytes=settings.TOKEN_CACHE_MAX_BYTES,
+    ttl_seconds=settings.TOKEN_EXPIRE_MIN * 60,
+)
 
-async def get_current_token(token: Annotated[str, Depends(oauth2_scheme)]) -> TokenPayload:
 
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Invalid or expired token",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def verify_token(token: str) -> TokenPayload:
+    """Decode the jwt and validate the claims we rely on, raises InvalidTokenError"""
+    payload = decode_access_token(token)
+
+    # Required claims
+    sub = payload.get("sub")
+    token_version = payload.get("token_version")
+    exp = payload.get("exp")
+
+    if not sub or not token_version or not exp:
+        raise InvalidTokenError("Missing claims")
 
+    # Validate UUID format
     try:
-        payload = decode_access_token(token)
+        UUID(sub)
+    except ValueError:
+        raise InvalidTokenError("Invalid subject")
+
+    return TokenPayload(sub=sub, token_version=token_version, exp=exp)
+
+
+_keyring_generation = keyring.generation
+
+
+def verify_token_cached(token: str) -> TokenPayload:
+    """verify_token memoized until the token expires"""
+    global _keyring_generation
+
+    if not settings.TOKEN_CACHE_ENABLED:
+        return verify_token(token)
+
+    # keys were rotated: a retired kid must stop verifying right away
+    if keyring.generation != _keyring_generation:
+        token_cache.clear()
+        _keyring_generation = keyring.generation
+
+    key = hashlib.sha256(token.encode()).digest()
+    token_payload = token_cache.get(key)
+    if token_payload is not None:
+        return token_payload
 
-        # Required claims
-        sub = payload.get("sub")
-        token_version = payload.get("token_version")
-        exp = payload.get("exp")
+    token_payload = verify_token(token)
+    remaining = token_payload.exp - time.time()
+    if jwt.get_unverified_header(token).get("kid") in (None, LEGACY_KID):
+        # a kid-less token must stop working at the legacy cutoff, not at its exp
+        remaining = min(remaining, legacy_seconds_left())
+    if remaining > 0:
+        token_cache.set(key, token_payload, size=len(token), ttl=remaining)
+    return token_payload
 
-        if not sub or not token_version or not exp:
-            raise credentials_exception
 
-          # Validate UUID format
-        try:
-            UUID(sub)
-        except ValueError:
-            raise credentials_exception
+def get_token_cache_stats() -> dict[str, int]:
+    return token_cache.stats()
 
-        return TokenPayload(sub=sub, token_version=token_version, exp=exp)
 
-    except (InvalidTokenError, TypeError, ValueError) as e:
+_UNVERIFIED = object()
+
+
+def get_request_token_payload(request: Request) -> Optional[TokenPayload]:
+    """
+    Bearer token of the request, verified at most once per request and kept on
+    request.state (the rate limit key and get_current_token share it).
+    None when there is no token or it doesn't verify.
+    """
+    token_payload = getattr(request.state, "token_payload", _UNVERIFIED)
+    if token_payload is _UNVERIFIED:
+        token_payload = None
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            try:
+                token_payload = verify_token_cached(token)
+            except (InvalidTokenError, TypeError, ValueError):
+                pass
+        request.state.token_payload = token_payload
+    return token_payload  # type: ignore[return-value]
+
+
+async def get_current_token(request: Request, token: Annotated[str, Depends(oauth2_scheme)]) -> TokenPayload:
+
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    # oauth2_scheme already rejected requests without a bearer token
+    token_payload = get_request_token_payload(request)
+    if token_payload is None:
         raise credentials_exception
+    return token_payload
 
 
-async def get_current_user(token_payload: Annotated[TokenPayload, Depends(get_current_token)], db: Annotated[AsyncSession, Depends(get_db)]) -> User:
+async def get_current_user(token_payload: Annotated[TokenPayload, Depends(get_current_token)], db: Annotated[AsyncSession, Depends(get_db)], cache: Annotated[CacheRedisManager, Depends(get_cache_manager)]) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Authentication credentials could not be validated",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    result = await db.execute(
-        select(User).where(User.id == token_payload.sub),
-    )
-    user = result.scalars().first()
+    user = await resolve_principal(db, cache, token_payload.sub, token_payload.token_version)
 
     if not user:
         raise credentials_exception
@@ -68,6 +139,14 @@ async def get_current_user(token_payload: Annotated[TokenPayload, Depends(get_cu
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Inactive user account",
         )
-    print("token payload", token_payload)
-    print("user", user)
     return user
+
+
+async def require_internal_client(x_internal_client_secret: Annotated[str | None, Header()] = None) -> None:
+    """Guard for service-to-service routes (introspection)"""
+    if settings.INTERNAL_CLIENT_SECRET is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    expected = settings.INTERNAL_CLIENT_SECRET.get_secret_value()
+    if not x_internal_client_secret or not hmac.compare_digest(x_internal_client_secret.encode(), expected.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid client credentials")
@@ -7,12 +7,14 @@ class AppException(Exception):
         error_code: str,
         message: str,
         status_code: int = status.HTTP_400_BAD_REQUEST,
-        details: dict | None = None
+        details: dict | None = None,
+        headers: dict | None = None
     ):
         self.error_code = error_code
         self.message = message
         self.status_code = status_code
         self.details = details
+        self.headers = headers
         super().__init__(message)
 
 
@@ -46,4 +48,24 @@ class BusinessRuleViolation(AppException):
             details=details
         )
 
- 
\ No newline at end of file
+
+class ServiceOverloaded(AppException):
+    def __init__(self, message="Service is busy, please retry later", retry_after: int = 1, details=None):
+        super().__init__(
+            error_code="SERVICE_OVERLOADED",
+            message=message,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            details=details,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+class LoginLockedOut(AppException):
+    def __init__(self, retry_after: int, message="Too many failed login attempts, please retry later"):
+        super().__init__(
+            error_code="LOGIN_LOCKED",
+            message=message,
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            details={"retry_after": retry_after},
+            headers={"Retry-After": str(retry_after)}
+        )
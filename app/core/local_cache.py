@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Optional, TypeVar
+import time
+
+V = TypeVar("V")
+
+
+class LocalTTLCache(Generic[V]):
+    """
+    Per process TTL + LRU cache bounded by entry count and (approximate) bytes.
+    Not thread safe, meant to be used from the event loop only.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # key -> (value, size, expires_at)
+        self._data: OrderedDict[Hashable, tuple[Any, int, float]] = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, size, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._remove(key, size)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V, size: int, ttl: Optional[float] = None) -> None:
+        if size > self.max_bytes:
+            return
+
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl is None else ttl)
+        self._data[key] = (value, size, expires_at)
+        self._bytes += size
+
+        # evict least recently used entries until both bounds hold
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._data.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        entry = self._data.get(key)
+        if entry is not None:
+            self._remove(key, entry[1])
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def _remove(self, key: Hashable, size: int) -> None:
+        del self._data[key]
+        self._bytes -= size
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,74 @@
+"""
+Prometheus metrics, scraped from GET /metrics.
+
+With several uvicorn/gunicorn workers set PROMETHEUS_MULTIPROC_DIR to an
+empty directory shared by the workers (wipe it on every deploy) before the
+app starts: each worker then writes its samples there and /metrics
+aggregates all of them. Without it every scrape only sees one worker.
+"""
+from typing import Optional
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# request / argon2 scale vs redis / jwt / pool wait scale
+SLOW_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+# http (MetricsMiddleware), route is the path template so cardinality stays bounded
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_REQUEST_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=SLOW_BUCKETS)
+HTTP_REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served", multiprocess_mode="livesum")
+
+# auth
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "Argon2 hash / verify time, including the wait for an executor worker",
+    ["operation"], buckets=SLOW_BUCKETS)
+JWT_DURATION = Histogram("jwt_duration_seconds", "JWT encode / decode time", ["operation"], buckets=FAST_BUCKETS)
+LOGIN_LOCKOUTS = Counter("login_lockouts_total", "Password logins rejected by the brute force lockout")
+# argon2 admission control (app.core.security.HashingAdmissionController)
+PASSWORD_HASH_IN_FLIGHT = Gauge("password_hash_in_flight", "Argon2 jobs holding an admission slot", multiprocess_mode="livesum")
+PASSWORD_HASH_QUEUED = Gauge("password_hash_queued", "Requests waiting for an argon2 admission slot", multiprocess_mode="livesum")
+
+# postgres pool (app.db.engine)
+DB_POOL_CHECKOUT_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time to get a connection from the sqlalchemy pool", buckets=FAST_BUCKETS)
+DB_POOL_IN_USE = Gauge("db_pool_connections_in_use", "Checked out sqlalchemy connections", multiprocess_mode="livesum")
+
+# redis, per manager (otp, cache, rate_limit, ...) and command
+REDIS_COMMAND_DURATION = Histogram("redis_command_duration_seconds", "Redis command round trip", ["manager", "command"], buckets=FAST_BUCKETS)
+REDIS_COMMAND_ERRORS = Counter("redis_command_errors_total", "Redis commands that raised", ["manager", "command"])
+# redis pools (standalone / sentinel), per logical db
+REDIS_POOL_IN_USE = Gauge("redis_pool_connections_in_use", "Checked out redis connections", ["db"], multiprocess_mode="livesum")
+REDIS_POOL_AVAILABLE = Gauge("redis_pool_connections_available", "Idle redis connections kept by the pool", ["db"], multiprocess_mode="livesum")
+
+# rate limiting, source is where the rejection was decided (redis or a local hybrid lease)
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests rejected by the rate limiter", ["limit", "source"])
+RATE_LIMIT_FAIL_OPEN = Counter("rate_limit_fail_open_total", "Requests let through unchecked because redis was unavailable")
+
+# email (smtp pool and outbox worker)
+EMAIL_SEND_DURATION = Histogram("email_send_duration_seconds", "SMTP send time", buckets=SLOW_BUCKETS)
+EMAIL_SENDS = Counter("email_sends_total", "SMTP sends", ["outcome"])
+EMAIL_OUTBOX_MESSAGES = Counter("email_outbox_messages_total", "Outbox messages handled by the worker", ["outcome"])
+
+
+def metrics_registry() -> CollectorRegistry:
+    """The default registry, or one aggregating every worker's files in multiprocess mode"""
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Exposition body and content type for /metrics"""
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid: Optional[int] = None) -> None:
+    """Drop the live gauges of an exiting worker (multiprocess mode only)"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,212 @@
+from typing import Optional
+from uuid import UUID
+import asyncio
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from app.core import get_settings, CacheRedisManager
+from app.core.local_cache import LocalTTLCache
+from app.models import User
+from app.schemas import Principal
+
+settings = get_settings()
+
+# Principals are cached per user id. The entry carries the token_version it
+# was built from, so a token is only served from cache when both match;
+# writes that bump the version or change the profile drop the entry.
+# Drops leave a short tombstone and read path writes never replace a newer
+# token_version, so a request that loaded the principal before the write
+# can't put the old snapshot back (profile writes keep the token_version,
+# only the tombstone protects those).
+PRINCIPAL_RESOURCE = "principal"
+
+# L1: per worker, in front of redis (L2). Writes broadcast an invalidation
+# over redis pub/sub so every worker drops its copy.
+principal_l1: LocalTTLCache[Principal] = LocalTTLCache(
+    max_entries=settings.PRINCIPAL_L1_MAX_ENTRIES,
+    max_bytes=settings.PRINCIPAL_L1_MAX_BYTES,
+    ttl_seconds=settings.PRINCIPAL_L1_TTL_SECONDS,
+)
+
+
+# only the columns a principal needs, read as plain rows (no ORM identity map / instances)
+PRINCIPAL_COLUMNS = [getattr(User, field) for field in Principal.model_fields]
+
+
+def principal_from_user(user: User) -> Principal:
+    return Principal.model_validate(user)
+
+
+async def load_principal(db: AsyncSession, user_id: str) -> Optional[Principal]:
+    """Read the principal straight from postgres."""
+    result = await db.execute(select(*PRINCIPAL_COLUMNS).where(User.id == UUID(user_id)))
+    row = result.mappings().first()
+    return Principal.model_validate(dict(row)) if row else None
+
+
+async def get_cached_principal(cache: CacheRedisManager, user_id: str) -> Optional[Principal]:
+    """Return the cached principal (L1 then redis) or None. Redis errors count as a miss."""
+    if settings.PRINCIPAL_L1_ENABLED:
+        principal = principal_l1.get(user_id)
+        if principal is not None:
+            return principal
+
+    try:
+        raw = await cache.get_cache(resource=PRINCIPAL_RESOURCE, identifier_prefix=user_id)
+    except Exception:
+        return None
+
+    if raw is None:
+        return None
+
+    try:
+        principal = Principal.model_validate_json(raw)
+    except ValidationError:
+        return None
+
+    if settings.PRINCIPAL_L1_ENABLED:
+        principal_l1.set(user_id, principal, size=len(raw))
+    return principal
+
+
+async def cache_principal(cache: CacheRedisManager, principal: Principal) -> None:
+    """Read path: cache what was loaded, unless a write invalidated / superseded it meanwhile"""
+    raw = principal.model_dump_json()
+    written = await cache.set_cache_if_newer(
+        resource=PRINCIPAL_RESOURCE,
+        identifier_prefix=str(principal.id),
+        value=raw,
+        version=principal.token_version,
+        version_field="token_version",
+    )
+    if written and settings.PRINCIPAL_L1_ENABLED:
+        principal_l1.set(str(principal.id), principal, size=len(raw))
+
+
+async def resolve_principal(db: AsyncSession, cache: CacheRedisManager, user_id: str, token_version: int) -> Optional[Principal]:
+    """Cache first, postgres only on a miss or a token_version mismatch"""
+    principal = await get_cached_principal(cache, user_id)
+    if principal is not None and principal.token_version == token_version:
+        return principal
+
+    principal = await load_principal(db, user_id)
+    if principal is not None:
+        try:
+            await cache_principal(cache, principal)
+        except Exception:
+            pass  # cache is best effort on the read path
+    return principal
+
+
+async def resolve_principals(db: AsyncSession, cache: CacheRedisManager, wanted: dict[str, int]) -> dict[str, Principal]:
+    """
+    Batch version of resolve_principal for {user_id: token_version}.
+    L1, then one redis MGET, then one `IN (...)` query for whatever is left.
+    Users that don't exist are missing from the result.
+    """
+    found: dict[str, Principal] = {}
+    missing: list[str] = []
+
+    for user_id, token_version in wanted.items():
+        principal = principal_l1.get(user_id) if settings.PRINCIPAL_L1_ENABLED else None
+        if principal is not None and principal.token_version == token_version:
+            found[user_id] = principal
+        else:
+            missing.append(user_id)
+
+    if missing:
+        try:
+            raws = await cache.get_many_cache(resource=PRINCIPAL_RESOURCE, identifier_prefixes=missing)
+        except Exception:
+            raws = [None] * len(missing)
+
+        still_missing = []
+        for user_id, raw in zip(missing, raws):
+            principal = None
+            if raw is not None:
+                try:
+                    principal = Principal.model_validate_json(raw)
+                except ValidationError:
+                    principal = None
+            if principal is not None and principal.token_version == wanted[user_id]:
+                found[user_id] = principal
+                if settings.PRINCIPAL_L1_ENABLED:
+                    principal_l1.set(user_id, principal, size=len(raw))
+            else:
+                still_missing.append(user_id)
+        missing = still_missing
+
+    if missing:
+        result = await db.execute(select(*PRINCIPAL_COLUMNS).where(User.id.in_([UUID(user_id) for user_id in missing])))
+        loaded = {str(row["id"]): Principal.model_validate(dict(row)) for row in result.mappings()}
+        found.update(loaded)
+        try:
+            await cache.set_many_cache_if_newer(
+                resource=PRINCIPAL_RESOURCE,
+                values={user_id: (principal.model_dump_json(), principal.token_version) for user_id, principal in loaded.items()},
+                version_field="token_version",
+            )
+        except Exception:
+            pass
+
+    return found
+
+
+async def invalidate_principal(cache: CacheRedisManager, user_id: str) -> None:
+    """Write path (after commit): drop the principal everywhere, tombstoned for PRINCIPAL_TOMBSTONE_SECONDS"""
+    principal_l1.delete(user_id)
+    await cache.invalidate_cache(resource=PRINCIPAL_RESOURCE, identifier_prefix=user_id, ttl=settings.PRINCIPAL_TOMBSTONE_SECONDS)
+    await cache.publish_invalidation(resource=PRINCIPAL_RESOURCE, identifier_prefix=user_id)
+
+
+def get_principal_cache_stats() -> dict[str, int]:
+    return principal_l1.stats()
+
+
+class PrincipalInvalidationListener:
+    """
+    Background task (one per worker) that drops L1 entries when any worker
+    publishes an invalidation. Started/stopped from the app lifespan.
+    """
+
+    def __init__(self, cache: CacheRedisManager) -> None:
+        self._cache = cache
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(), name="principal-invalidation-listener")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self) -> None:
+        prefix = f"{PRINCIPAL_RESOURCE}:"
+        while True:
+            pubsub = self._cache.pubsub()
+            try:
+                await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+                # messages may have been missed while we were not subscribed
+                principal_l1.clear()
+                while True:
+                    # short polls instead of listen(): a quiet channel must not trip the pool's socket timeout
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None:
+                        continue
+                    data = message.get("data")
+                    if message.get("type") == "message" and isinstance(data, str) and data.startswith(prefix):
+                        principal_l1.delete(data[len(prefix):])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # connection dropped, resubscribe after a short pause
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
@@ -0,0 +1,172 @@
+"""
+On demand profiling, written as folded stacks (`frame;frame;frame weight`
+per line) that flamegraph.pl, inferno and speedscope read directly.
+
+- RequestProfiler: wall clock sampler for one request task, used by
+  app.middleware.ProfilingMiddleware
+- tracemalloc helpers: start / snapshot / stop, driven by the debug endpoints
+"""
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Any, Optional
+import asyncio
+import os
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+
+from app.core import get_settings
+
+settings = get_settings()
+
+
+def _frame_label(code: CodeType) -> str:
+    # function + file:first line, so samples of one function merge into one box
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+# app/..., fastapi/..., asyncio/... instead of absolute paths
+_PATH_PREFIXES = ("site-packages" + os.sep, os.getcwd() + os.sep, sysconfig.get_paths()["stdlib"] + os.sep)
+
+
+def _short_path(path: str) -> str:
+    for prefix in _PATH_PREFIXES:
+        index = path.find(prefix)
+        if index != -1:
+            return path[index + len(prefix):]
+    return path
+
+
+def _thread_stack(frame: Optional[FrameType], root: Optional[FrameType]) -> list[str]:
+    """Outermost first, starting at the task's root coroutine (drops the event loop frames below it)"""
+    frames: list[FrameType] = []
+    while frame is not None:
+        frames.append(frame)
+        if frame is root:
+            break
+        frame = frame.f_back
+    return [_frame_label(f.f_code) for f in reversed(frames)]
+
+
+def _await_stack(coro: Any) -> list[str]:
+    """Where a suspended task waits: its coroutine chain down to the awaited future"""
+    stack = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            stack.append(f"[await {type(coro).__name__}]")
+            break
+        stack.append(_frame_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return stack
+
+
+class RequestProfiler:
+    """
+    Samples one asyncio task from a background thread every `interval` seconds.
+    While the task holds the event loop the sample is its python stack (cpu);
+    while it is suspended it is its await chain (db / redis / threadpool waits),
+    ending in an `[await ...]` frame. Other requests running on the loop in the
+    meantime are not counted.
+    """
+
+    def __init__(self, task: asyncio.Task, interval: float) -> None:
+        self.task = task
+        self.loop = task.get_loop()
+        self.thread_id = threading.get_ident()  # the event loop thread, we are created on it
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stopping.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                self._sample()
+            except Exception:
+                pass  # the task moved on while we were walking it, skip this tick
+
+    def _sample(self) -> None:
+        coro = self.task.get_coro()
+        if asyncio.current_task(self.loop) is self.task:
+            stack = _thread_stack(sys._current_frames().get(self.thread_id), getattr(coro, "cr_frame", None))
+        else:
+            stack = _await_stack(coro)
+        if stack:
+            self.samples[";".join(stack)] += 1
+
+
+def write_folded(samples: Counter[str], name: str) -> str:
+    """Write samples to PROFILING_DIR/<name>.folded and return the path"""
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILING_DIR, f"{name}.folded")
+    with open(path, "w") as f:
+        for stack, weight in samples.most_common():
+            f.write(f"{stack} {weight}\n")
+    return path
+
+
+# -------------------------------------------------------------------------
+# tracemalloc (per worker, only while started)
+# -------------------------------------------------------------------------
+
+def start_tracemalloc(frames: int) -> dict[str, Any]:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    return tracemalloc_status()
+
+
+def stop_tracemalloc() -> dict[str, Any]:
+    status = tracemalloc_status()
+    tracemalloc.stop()
+    return status
+
+
+def tracemalloc_status() -> dict[str, Any]:
+    current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    return {
+        "pid": os.getpid(),
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit(),
+        "current_bytes": current,
+        "peak_bytes": peak,
+    }
+
+
+def tracemalloc_snapshot(limit: int) -> dict[str, Any]:
+    """
+    Top `limit` allocation sites by size, plus every live traceback written as
+    folded stacks weighted by bytes (a memory flamegraph). Blocking, call it
+    from a thread.
+    """
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running")
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+
+    folded: Counter[str] = Counter()
+    for stat in snapshot.statistics("traceback"):
+        # oldest frame first, same order as folded stacks
+        frames = [f"{_short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback]
+        folded[";".join(frames)] += stat.size
+    path = write_folded(folded, f"memory-{int(time.time())}-{os.getpid()}")
+
+    top = [
+        {"location": f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", "size_bytes": stat.size, "count": stat.count}
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+    return {**tracemalloc_status(), "top": top, "folded_path": path}
@@ -1,14 +1,371 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from dataclasses import dataclass
+from ipaddress import ip_address
+from typing import Any, Awaitable, Callable, Literal, Optional
+import functools
+import inspect
+import math
+import time
+
+from limits import RateLimitItem, parse_many
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.core import get_settings
+from app.core.dependencies import get_request_token_payload
+from app.core.local_cache import LocalTTLCache
+from app.core.metrics import RATE_LIMIT_FAIL_OPEN, RATE_LIMIT_REJECTIONS
+from app.core.redis import get_rate_limit_manager
 
 settings = get_settings()
 
+KeyFunc = Callable[[Request], str]
+
+
+TRUSTED_PROXIES = settings.RATE_LIMIT_TRUSTED_PROXY_NETWORKS
+
+
+def get_remote_address(request: Request) -> str:
+    return request.client.host if request.client else "127.0.0.1"
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def get_forwarded_address(request: Request) -> str:
+    """
+    Client ip behind our proxies. X-Forwarded-For is only read when the peer is
+    a trusted proxy, and walked right to left: the first hop that isn't one of
+    ours is the address our outermost proxy saw, anything left of it is client
+    supplied and can be forged.
+    """
+    remote = get_remote_address(request)
+    if not TRUSTED_PROXIES or not _is_trusted_proxy(remote):
+        return remote
+
+    hops = [hop.strip() for header in request.headers.getlist("X-Forwarded-For") for hop in header.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    # every hop is one of ours (internal caller)
+    return hops[0] if hops else remote
+
+
+def get_user_or_address(request: Request) -> str:
+    """jwt sub for authenticated requests, the forwarded client ip otherwise"""
+    token_payload = get_request_token_payload(request)
+    if token_payload is not None:
+        return f"user:{token_payload.sub}"
+    return f"ip:{get_forwarded_address(request)}"
+
+
+KEY_FUNCS: dict[str, "KeyFunc"] = {
+    "remote": get_remote_address,
+    "forwarded": get_forwarded_address,
+    "user": get_user_or_address,
+}
+
+
+class RateLimitExceeded(Exception):
+    """Raised by the limiter, rendered by rate_limit_exceeded_handler"""
+
+    def __init__(self, limit: RateLimitItem, retry_after: int, source: str = "redis") -> None:
+        self.limit = limit
+        self.retry_after = retry_after
+        self.source = source  # "local" when a hybrid lease already knew the window was full
+        self.detail = str(limit)  # e.g. "5 per 1 minute"
+        super().__init__(self.detail)
+
+
+@dataclass
+class _Lease:
+    """Tokens of one window reserved in redis by this worker (hybrid mode)"""
+    tokens: int
+    remaining: int  # room left in redis right after the lease was taken
+    expires_at: float  # monotonic time the redis window resets
+
+
+@dataclass
+class RateLimitState:
+    """Tightest window of the request, used for the X-RateLimit-* headers"""
+    limit: RateLimitItem
+    remaining: int
+    reset_after: int
+
+
+# fail open log lines while redis is unavailable, at most one per interval per worker
+FAIL_OPEN_LOG_INTERVAL_SECONDS = 30.0
+
+
+class Limiter:
+    """
+    Async replacement for slowapi's Limiter with the same decorator API:
+
+        @router.post(...)
+        @limiter.limit("5/minute")
+        async def endpoint(request: Request, response: Response, ...)
+
+    Every limit of a request is checked and counted by one redis script
+    (fixed windows), nothing blocks the event loop. Routes without a
+    decorator get `default_limits` from RateLimitMiddleware unless marked
+    with @limiter.exempt.
+
+    strategy="hybrid": each worker leases batches of `amount * hybrid_error`
+    tokens per window and serves requests from them locally, so redis is only
+    asked once per batch (and per request once a window is nearly full, where
+    batches shrink to what is left). Leases are reserved up front so the
+    global limit is never exceeded; unused tokens leased by other workers can
+    make a client hit it early by up to workers x batch.
+    """
+
+    def __init__(
+        self,
+        key_func: KeyFunc,
+        default_limits: list[str],
+        enabled: bool = True,
+        headers_enabled: bool = True,
+        strategy: Literal["redis", "hybrid"] = "redis",
+        hybrid_error: float = 0.1,
+        local_max_keys: int = 100000,
+    ) -> None:
+        self.key_func = key_func
+        self.default_limits: list[RateLimitItem] = [item for limit in default_limits for item in parse_many(limit)]
+        self.enabled = enabled
+        self.headers_enabled = headers_enabled
+        self.strategy = strategy
+        self.hybrid_error = hybrid_error
+        # key -> lease, dropped when its window resets
+        self._leases: LocalTTLCache[_Lease] = LocalTTLCache(max_entries=local_max_keys, max_bytes=local_max_keys, ttl_seconds=60)
+
+        self.checks = 0
+        self.redis_calls = 0
+        self.local_rejections = 0
+        self.fail_open = 0
+        self._fail_open_logged = 0  # fail_open count at the last log line
+        self._next_fail_open_log = 0.0
+
+    # -------------------------------------------------------------------------
+    # Decorators
+    # -------------------------------------------------------------------------
+
+    def limit(self, limit_value: str, key_func: Optional[KeyFunc] = None, cost: int = 1) -> Callable:
+        items = parse_many(limit_value)
+
+        def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+            if "request" not in inspect.signature(func).parameters:
+                raise RuntimeError(f"{func.__name__} needs a `request: Request` argument to be rate limited")
+            scope = f"{func.__module__}.{func.__name__}"
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request: Request = kwargs["request"]
+                state = await self.hit(request, items, scope, key_func=key_func, cost=cost)
+                result = await func(*args, **kwargs)
+
+                if self.headers_enabled and state is not None:
+                    target = result if isinstance(result, Response) else kwargs.get("response")
+                    if isinstance(target, Response):
+                        self.inject_headers(target.headers, state)
+                return result
+
+            wrapper._rate_limited = True  # type: ignore[attr-defined]
+            return wrapper
+
+        return decorator
+
+    def exempt(self, func: Callable) -> Callable:
+        func._rate_limit_exempt = True  # type: ignore[attr-defined]
+        return func
+
+    # -------------------------------------------------------------------------
+    # Engine
+    # -------------------------------------------------------------------------
+
+    def _window_key(self, client_key: str, scope: str, item: RateLimitItem) -> str:
+        # client key as hash tag: all windows of one check live on the same cluster slot
+        return f"ratelimit:{{{client_key}}}:{scope}:{item.amount}/{item.get_expiry()}"
+
+    async def hit(self, request: Request, items: list[RateLimitItem], scope: str, key_func: Optional[KeyFunc] = None, cost: int = 1) -> Optional[RateLimitState]:
+        """
+        Count the request against every window, raise RateLimitExceeded when one is full.
+        Returns None when limiting is disabled or redis is unavailable (fail open).
+        """
+        if not self.enabled or not items:
+            return None
+
+        self.checks += 1
+        client_key = (key_func or self.key_func)(request)
+        keys = [self._window_key(client_key, scope, item) for item in items]
+        try:
+            if self.strategy == "hybrid":
+                state = await self._hit_hybrid(keys, items, cost)
+            else:
+                state = await self._hit_redis(keys, items, cost)
+        except RateLimitExceeded as exc:
+            RATE_LIMIT_REJECTIONS.labels(exc.detail, exc.source).inc()
+            raise
+        except Exception as e:
+            self._record_fail_open(e)
+            return None
+
+        request.state.rate_limit_state = state
+        return state
+
+    def _record_fail_open(self, error: Exception) -> None:
+        # redis down means every request lands here, log at most once per interval
+        self.fail_open += 1
+        RATE_LIMIT_FAIL_OPEN.inc()
+        now = time.monotonic()
+        if now >= self._next_fail_open_log:
+            self._next_fail_open_log = now + FAIL_OPEN_LOG_INTERVAL_SECONDS
+            print(f"Rate limiter unavailable, letting requests through ({self.fail_open - self._fail_open_logged} since last report): {error!r}")
+            self._fail_open_logged = self.fail_open
+
+    async def _hit_redis(self, keys: list[str], items: list[RateLimitItem], cost: int) -> RateLimitState:
+        self.redis_calls += 1
+        allowed, counts = await get_rate_limit_manager().hit(
+            [(key, item.amount, item.get_expiry()) for key, item in zip(keys, items)], cost=cost
+        )
+
+        if not allowed:
+            full = [(item, ttl) for item, (count, ttl) in zip(items, counts) if count + cost > item.amount]
+            limit, retry_after = max(full, key=lambda f: f[1])
+            raise RateLimitExceeded(limit, retry_after=max(retry_after, 1))
+
+        # the window closest to its limit decides the headers / retry time
+        return min(
+            (RateLimitState(item, max(item.amount - count, 0), ttl) for item, (count, ttl) in zip(items, counts)),
+            key=lambda s: (s.remaining, -s.reset_after),
+        )
+
+    async def _hit_hybrid(self, keys: list[str], items: list[RateLimitItem], cost: int) -> RateLimitState:
+        while True:
+            now = time.monotonic()
+            leases = [self._leases.get(key) for key in keys]
+
+            # a window known to be full stays full until it resets, no need to ask redis
+            for item, lease in zip(items, leases):
+                if lease is not None and lease.tokens < cost and lease.remaining < cost:
+                    self.local_rejections += 1
+                    raise RateLimitExceeded(item, retry_after=max(math.ceil(lease.expires_at - now), 1), source="local")
+
+            refill = [i for i, lease in enumerate(leases) if lease is None or lease.tokens < cost]
+            if not refill:
+                break
+
+            self.redis_calls += 1
+            allowed, grants = await get_rate_limit_manager().lease(
+                [(keys[i], items[i].amount, items[i].get_expiry(), max(int(items[i].amount * self.hybrid_error), cost)) for i in refill],
+                cost=cost,
+            )
+            now = time.monotonic()
+            for i, (granted, count, ttl) in zip(refill, grants):
+                # another request of this worker may have refilled while we waited
+                current = self._leases.get(keys[i])
+                leftover = current.tokens if current is not None else 0
+                self._leases.set(keys[i], _Lease(tokens=leftover + granted, remaining=items[i].amount - count, expires_at=now + ttl), size=1, ttl=ttl)
+
+            if not allowed:
+                full = [(items[i], grants[n][2]) for n, i in enumerate(refill) if items[i].amount - grants[n][1] < cost]
+                limit, retry_after = max(full, key=lambda f: f[1])
+                raise RateLimitExceeded(limit, retry_after=max(retry_after, 1))
+
+            # the leases we didn't refill may have been drained (and replaced) by concurrent
+            # requests during the await: look again, granted tokens stay in their leases
+            leases = [self._leases.get(key) for key in keys]
+            if all(lease is not None and lease.tokens >= cost for lease in leases):
+                break
+
+        # no await from the last lookup on, so these are the current leases
+        for lease in leases:
+            lease.tokens -= cost  # type: ignore[union-attr]
+
+        return min(
+            (RateLimitState(item, lease.remaining + lease.tokens, max(math.ceil(lease.expires_at - now), 0)) for item, lease in zip(items, leases)),  # type: ignore[union-attr]
+            key=lambda s: (s.remaining, -s.reset_after),
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "checks": self.checks,
+            "redis_calls": self.redis_calls,
+            "local_rejections": self.local_rejections,
+            "fail_open": self.fail_open,
+            "leases": self._leases.stats()["entries"],
+        }
+
+    def inject_headers(self, headers: MutableHeaders, state: RateLimitState) -> None:
+        headers["X-RateLimit-Limit"] = str(state.limit.amount)
+        headers["X-RateLimit-Remaining"] = str(state.remaining)
+        headers["X-RateLimit-Reset"] = str(int(time.time()) + state.reset_after)
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware applying the default limits (per route) to routes
+    that have neither @limiter.limit nor @limiter.exempt.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: "Limiter") -> None:
+        self.app = app
+        self.limiter = limiter
+
+    def _match_route(self, scope: Scope) -> Any:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.limiter.enabled or not self.limiter.default_limits:
+            await self.app(scope, receive, send)
+            return
+
+        route = self._match_route(scope)
+        endpoint = getattr(route, "endpoint", None)
+        if route is None or getattr(endpoint, "_rate_limit_exempt", False) or getattr(endpoint, "_rate_limited", False):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        try:
+            state = await self.limiter.hit(request, self.limiter.default_limits, scope=route.path)
+        except RateLimitExceeded as exc:
+            handler = scope["app"].exception_handlers[RateLimitExceeded]
+            response = await handler(request, exc)
+            await response(scope, receive, send)
+            return
+
+        if state is None or not self.limiter.headers_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                self.limiter.inject_headers(MutableHeaders(scope=message), state)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
 limiter = Limiter(
-    key_func=get_remote_address,
-    storage_uri=settings.REDIS_URL,
-    enabled=settings.RATE_LIMIT_ENABLED,
+    key_func=KEY_FUNCS[settings.RATE_LIMIT_KEY],
     default_limits=[settings.RATE_LIMIT_DEFAULT],
+    enabled=settings.RATE_LIMIT_ENABLED,
     headers_enabled=True,
+    strategy=settings.RATE_LIMIT_STRATEGY,
+    hybrid_error=settings.RATE_LIMIT_HYBRID_ERROR,
+    local_max_keys=settings.RATE_LIMIT_LOCAL_MAX_KEYS,
 )
+
+
+def get_rate_limit_stats() -> dict[str, int]:
+    return limiter.stats()
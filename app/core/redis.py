@@ -1,14 +1,271 @@
 from __future__ import annotations
-from typing import Any,Optional
+from typing import Any,AsyncIterator,Optional,Literal,NamedTuple
+from contextlib import asynccontextmanager
+import hashlib
+import json
+import secrets
+import time
 import redis.asyncio as aioredis
 from redis.asyncio import Redis, ConnectionPool
+from redis.asyncio.cluster import RedisCluster, ClusterNode
+from redis.asyncio.sentinel import Sentinel, SentinelConnectionPool
+from redis.asyncio.client import PubSub, Pipeline
+from redis.commands.core import AsyncScript
+from redis.exceptions import ResponseError, ConnectionError as RedisConnectionError
 from pydantic import EmailStr
 from abc import ABC ,abstractmethod
 
 from app.core import get_settings, DatabaseError
+from app.core.metrics import REDIS_COMMAND_DURATION, REDIS_COMMAND_ERRORS, REDIS_POOL_IN_USE, REDIS_POOL_AVAILABLE
+from app.core.tracing import traced, inject_context
+from opentelemetry.trace import SpanKind
 
 settings = get_settings()
 
+
+class _PoolStatsMixin:
+    """
+    Counts callers that found the pool exhausted, how long they waited and how
+    many gave up, and keeps the redis_pool_connections_* gauges up to date
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_timeouts = 0
+        self.wait_seconds = 0.0
+        db = str(self.connection_kwargs.get("db", 0)) # type: ignore
+        self._in_use_gauge = REDIS_POOL_IN_USE.labels(db)
+        self._available_gauge = REDIS_POOL_AVAILABLE.labels(db)
+
+    def _update_gauges(self) -> None:
+        self._in_use_gauge.set(len(self._in_use_connections)) # type: ignore
+        self._available_gauge.set(len(self._available_connections)) # type: ignore
+
+    async def get_connection(self, *args, **kwargs):
+        if self.can_get_connection(): # type: ignore
+            connection = await super().get_connection() # type: ignore
+            self._update_gauges()
+            return connection
+
+        self.waits += 1
+        start = time.monotonic()
+        try:
+            connection = await super().get_connection() # type: ignore
+        except RedisConnectionError:
+            self.wait_timeouts += 1
+            raise
+        finally:
+            self.wait_seconds += time.monotonic() - start
+        self._update_gauges()
+        return connection
+
+    async def release(self, connection) -> None:
+        await super().release(connection) # type: ignore
+        self._update_gauges()
+
+    async def aclose(self) -> None:
+        await super().aclose() # type: ignore
+        self._in_use_gauge.set(0)
+        self._available_gauge.set(0)
+
+    def stats(self) -> dict[str, float]:
+        in_use = len(self._in_use_connections) # type: ignore
+        idle = len(self._available_connections) # type: ignore
+        return {
+            "max_connections": self.max_connections, # type: ignore
+            "in_use": in_use,
+            "idle": idle,
+            "utilization": round(in_use / self.max_connections, 3), # type: ignore
+            "waits": self.waits,
+            "wait_timeouts": self.wait_timeouts,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+class InstrumentedConnectionPool(_PoolStatsMixin, aioredis.ConnectionPool):
+    """Fails immediately when full (every exhaustion shows up as a wait timeout)"""
+
+
+class InstrumentedBlockingConnectionPool(_PoolStatsMixin, aioredis.BlockingConnectionPool):
+    """Waits up to REDIS_POOL_TIMEOUT_SECONDS for a connection to be released"""
+
+
+class InstrumentedSentinelConnectionPool(_PoolStatsMixin, SentinelConnectionPool):
+    """Follows the primary elected by the sentinels (non blocking, fails immediately when full)"""
+
+
+class _CommandMetricsMixin:
+    """Times every command into redis_command_duration_seconds{manager, command} and traces it"""
+
+    def __init__(self, *args, metrics_name: str = "redis", **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics_name = metrics_name
+        self._timers: dict[str, Any] = {}
+
+    async def execute_command(self, *args, **options):
+        command = str(args[0])
+        timer = self._timers.get(command)
+        if timer is None:
+            timer = self._timers[command] = REDIS_COMMAND_DURATION.labels(self.metrics_name, command)
+
+        start = time.perf_counter()
+        try:
+            with traced(f"redis {command}", SpanKind.CLIENT, {"db.system": "redis", "db.operation": command, "redis.manager": self.metrics_name}):
+                return await super().execute_command(*args, **options) # type: ignore
+        except Exception:
+            REDIS_COMMAND_ERRORS.labels(self.metrics_name, command).inc()
+            raise
+        finally:
+            timer.observe(time.perf_counter() - start)
+
+
+class InstrumentedRedis(_CommandMetricsMixin, aioredis.Redis):
+    """One per manager, on the shared pool of its db"""
+
+
+class InstrumentedRedisCluster(_CommandMetricsMixin, RedisCluster):
+    """Shared by every manager, commands are labelled `cluster`"""
+
+
+class RedisPoolRegistry:
+    """
+    Shared pools, ref counted by the managers using them. Managers acquire
+    on init and release on close; the last release closes the pool.
+
+    - standalone / sentinel: one pool per logical db, each manager gets its own
+      (cheap) client on it so command metrics are labelled per manager
+    - cluster: one RedisCluster client for everything (cluster only has db 0)
+    """
+
+    def __init__(self) -> None:
+        self._cluster: RedisCluster | None = None
+        self._pools: dict[int, ConnectionPool] = {}
+        self._refs: dict[int, int] = {}
+        self._sentinel: Sentinel | None = None
+        self._pubsub_pool: ConnectionPool | None = None
+
+    @property
+    def cluster(self) -> bool:
+        return settings.REDIS_MODE == "cluster"
+
+    def _connection_kwargs(self) -> dict[str, Any]:
+        return dict(
+            password=settings.REDIS_PSWD,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS,
+            socket_keepalive=settings.REDIS_SOCKET_KEEPALIVE,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+            decode_responses=True,
+        )
+
+    def _create_pool(self, db: int) -> ConnectionPool:
+        kwargs = dict(self._connection_kwargs(), db=db, max_connections=settings.REDIS_MAX_CONNECTIONS)
+
+        if settings.REDIS_MODE == "sentinel":
+            if self._sentinel is None:
+                sentinel_kwargs = {k: v for k, v in kwargs.items() if k.startswith("socket_")}
+                sentinel_kwargs["password"] = settings.REDIS_SENTINEL_PASSWORD
+                self._sentinel = Sentinel(settings.REDIS_SENTINEL_NODES, sentinel_kwargs=sentinel_kwargs)
+            return InstrumentedSentinelConnectionPool(settings.REDIS_SENTINEL_MASTER, self._sentinel, ssl=settings.REDIS_USE_SSL, **kwargs)
+
+        kwargs.update(
+            host=settings.REDIS_HOST,
+            port=int(settings.REDIS_PORT),
+            connection_class=aioredis.SSLConnection if settings.REDIS_USE_SSL else aioredis.Connection,
+        )
+        if settings.REDIS_POOL_BLOCKING:
+            return InstrumentedBlockingConnectionPool(timeout=settings.REDIS_POOL_TIMEOUT_SECONDS, **kwargs)
+        return InstrumentedConnectionPool(**kwargs)
+
+    def _create_cluster(self) -> RedisCluster:
+        return InstrumentedRedisCluster(
+            metrics_name="cluster",
+            startup_nodes=[ClusterNode(host, port) for host, port in settings.REDIS_CLUSTER_STARTUP_NODES],
+            max_connections=settings.REDIS_MAX_CONNECTIONS,  # per node
+            ssl=settings.REDIS_USE_SSL,
+            **self._connection_kwargs(),
+        )
+
+    def acquire(self, db: int, name: str = "redis") -> Redis | RedisCluster:
+        key = 0 if self.cluster else db
+        self._refs[key] = self._refs.get(key, 0) + 1
+
+        if self.cluster:
+            if self._cluster is None:
+                self._cluster = self._create_cluster()
+            return self._cluster
+
+        if key not in self._pools:
+            self._pools[key] = self._create_pool(db)
+        # doesn't own the pool, closing the client leaves it open for the other managers
+        return InstrumentedRedis(connection_pool=self._pools[key], metrics_name=name)
+
+    async def release(self, db: int, client: Redis | RedisCluster) -> None:
+        key = 0 if self.cluster else db
+        if key not in self._refs:
+            return
+        if not self.cluster:
+            await client.aclose()
+        self._refs[key] -= 1
+        if self._refs[key] > 0:
+            return
+
+        del self._refs[key]
+        if self.cluster and self._cluster is not None:
+            await self._cluster.aclose()
+            self._cluster = None
+        pool = self._pools.pop(key, None)
+        if pool is not None:
+            await pool.aclose()
+
+        if not self._refs:
+            if self._pubsub_pool is not None:
+                await self._pubsub_pool.aclose()
+                self._pubsub_pool = None
+            if self._sentinel is not None:
+                for sentinel in self._sentinel.sentinels:
+                    await sentinel.aclose()
+                self._sentinel = None
+
+    def pubsub_pool(self, client: RedisCluster) -> ConnectionPool:
+        """
+        The async cluster client has no pub/sub. PUBLISH is broadcast to
+        every node of a cluster, so subscribing on any single primary is enough.
+        """
+        if self._pubsub_pool is None:
+            node = client.get_nodes()[0] if client.get_nodes() else ClusterNode(*settings.REDIS_CLUSTER_STARTUP_NODES[0])
+            self._pubsub_pool = aioredis.ConnectionPool(
+                host=node.host,
+                port=node.port,
+                connection_class=aioredis.SSLConnection if settings.REDIS_USE_SSL else aioredis.Connection,
+                **self._connection_kwargs(),
+            )
+        return self._pubsub_pool
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        if self.cluster:
+            stats = {}
+            for node in self._cluster.get_nodes() if self._cluster is not None else []:
+                idle = len(node._free)
+                in_use = len(node._connections) - idle
+                stats[node.name] = {
+                    "max_connections": node.max_connections,
+                    "in_use": in_use,
+                    "idle": idle,
+                    "utilization": round(in_use / node.max_connections, 3),
+                }
+            return stats
+        return {f"db{db}": pool.stats() for db, pool in sorted(self._pools.items()) if isinstance(pool, _PoolStatsMixin)}
+
+
+redis_pools = RedisPoolRegistry()
+
+
+def get_redis_pool_stats() -> dict[str, dict[str, float]]:
+    return redis_pools.stats()
+
+
 class BaseRedisManager(ABC):
     #we have used "RedisManager" because there is not RedisManager instance type before the class is defined 
     # to avoid the "RedisManager" string quotation we can use from __future__ import annotations
@@ -27,8 +284,7 @@ class BaseRedisManager(ABC):
 
          #extending this class for cache purpose also 
         #if not hasattr(self,"_initialized"):   
-        self._pool: ConnectionPool | None = None 
-        self._client: Redis | None = None
+        self._client: Redis | RedisCluster | None = None
           #  self._initialized = True
 
     # ── Abstract contract ──────────────────────
@@ -37,27 +293,24 @@ class BaseRedisManager(ABC):
     def db_index(self)-> int:
         pass
 
+    @property
+    def metrics_name(self) -> str:
+        """`manager` label of the redis command metrics, e.g. otp, cache, ratelimit"""
+        return type(self).__name__.removesuffix("RedisManager").lower()
+
     # ── Lifecycle ──────────────────────────────
     async def init(self)-> None:
-        """Call once on startup to initialize the pool."""
-        self._pool =  self._pool = aioredis.ConnectionPool(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=self.db_index,
-            max_connections=20,
-            decode_responses=True
-        )
-        self._client = aioredis.Redis(connection_pool=self._pool)
+        """Call once on startup, attaches to the shared pool of this db."""
+        self._client = redis_pools.acquire(self.db_index, name=self.metrics_name)
 
         await self.ping()
 
 
     async def close(self):
-        """Close pool on shutdown"""
+        """Release the shared pool on shutdown (closed with its last user)"""
         if self._client:
-            await self._client.aclose()
-        if self._pool:
-            await self._pool.aclose()
+            client, self._client = self._client, None
+            await redis_pools.release(self.db_index, client)
 
     # -------------------------------------------------------------------------
     # Health
@@ -70,6 +323,75 @@ class BaseRedisManager(ABC):
         except Exception as e:
             raise DatabaseError(f"Redis ping failed: {self.db_index} : {e}")
 
+    async def _load_script(self, lua: str) -> AsyncScript:
+        """SCRIPT LOAD once at startup, calls then go out as EVALSHA (re-loaded automatically after a flush)"""
+        script = self._client.register_script(lua) # type: ignore
+        await self._client.script_load(lua) # type: ignore
+        return script
+
+    # -------------------------------------------------------------------------
+    # Batch operations (N keys, one round trip)
+    # -------------------------------------------------------------------------
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False) -> AsyncIterator[Pipeline]:
+        """
+        Queue commands and send them in one round trip. Whatever is still
+        queued when the block exits is executed; call `await pipe.execute()`
+        inside the block when the replies are needed.
+        On a cluster, transactions only work when every key shares a hash tag.
+        """
+        self._ensure_client()
+
+        # pipelines bypass execute_command, the whole block is timed instead
+        command = "MULTI" if transaction else "PIPELINE"
+        start = time.perf_counter()
+        try:
+            with traced(f"redis {command}", SpanKind.CLIENT, {"db.system": "redis", "db.operation": command, "redis.manager": self.metrics_name}):
+                async with self._client.pipeline(transaction=transaction) as pipe: # type: ignore
+                    yield pipe
+                    if len(pipe):
+                        await pipe.execute()
+        finally:
+            REDIS_COMMAND_DURATION.labels(self.metrics_name, command).observe(time.perf_counter() - start)
+
+    async def mget(self, keys: list[str]) -> list[Optional[str]]:
+        """Values in the same order as `keys`, None for missing ones"""
+        self._ensure_client()
+
+        if not keys:
+            return []
+        if isinstance(self._client, RedisCluster):
+            return await self._client.mget_nonatomic(keys) # split per slot, fanned out per node
+        return await self._client.mget(keys) # type: ignore
+
+    async def mset(self, values: dict[str, Any], ttl: Optional[int] = None, ttls: Optional[dict[str, int]] = None) -> None:
+        """
+        Write many keys at once. `ttl` applies to every key, `ttls` overrides it per key.
+        Without any ttl this is a single MSET, otherwise pipelined SET EX.
+        """
+        self._ensure_client()
+
+        if not values:
+            return
+        if ttl is None and not ttls:
+            if isinstance(self._client, RedisCluster):
+                await self._client.mset_nonatomic(values)
+            else:
+                await self._client.mset(values) # type: ignore
+            return
+        async with self.pipeline() as pipe:
+            for key, value in values.items():
+                pipe.set(key, value, ex=(ttls or {}).get(key, ttl))
+
+    async def mdelete(self, keys: list[str]) -> int:
+        """UNLINK many keys (memory is reclaimed in the background), returns how many existed"""
+        self._ensure_client()
+
+        if not keys:
+            return 0
+        return await self._client.unlink(*keys) # type: ignore
+
     def get_client(self) -> Redis:
         """Returns a Redis client using the shared pool."""
         self._ensure_client()
@@ -89,20 +411,120 @@ class BaseRedisManager(ABC):
         
 
 
+# Issue an otp only when none is pending.
+# KEYS[1] otp, KEYS[3] lockout. ARGV[1] hashed otp, ARGV[2] ttl seconds
+# returns {1, ttl} issued | {0, ttl left} one is already pending | {-1, ttl left} locked out
+ISSUE_OTP_LUA = """
+local locked = redis.call('TTL', KEYS[3])
+if locked > 0 then
+    return {-1, locked}
+end
+local pending = redis.call('TTL', KEYS[1])
+if pending > 0 then
+    return {0, pending}
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return {1, tonumber(ARGV[2])}
+"""
+
+# Check a code and consume the otp when it matches.
+# KEYS[1] otp, KEYS[2] attempts, KEYS[3] lockout. ARGV[1] hashed candidate, ARGV[2] max attempts, ARGV[3] lockout seconds
+# returns {1, 0} ok | {0, attempts left} wrong code | {-1, 0} no otp pending | {-2, ttl left} locked out
+VERIFY_OTP_LUA = """
+local locked = redis.call('TTL', KEYS[3])
+if locked > 0 then
+    return {-2, locked}
+end
+local stored = redis.call('GET', KEYS[1])
+if not stored then
+    return {-1, 0}
+end
+if stored == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return {1, 0}
+end
+local attempts = redis.call('INCR', KEYS[2])
+if attempts == 1 then
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+end
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    redis.call('SET', KEYS[3], '1', 'EX', ARGV[3])
+    return {-2, tonumber(ARGV[3])}
+end
+return {0, tonumber(ARGV[2]) - attempts}
+"""
+
+
+class OTPIssueResult(NamedTuple):
+    issued: bool
+    locked: bool
+    ttl: int  # seconds until the pending otp / lockout expires
+
+
+class OTPVerifyResult(NamedTuple):
+    status: Literal["ok", "invalid", "missing", "locked"]
+    attempts_left: int = 0
+    retry_after: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
 class OTPRedisManager(BaseRedisManager):
     #_instance = None
 
+    def __init__(self) -> None:
+        super().__init__()
+        self._issue_script: AsyncScript | None = None
+        self._verify_script: AsyncScript | None = None
+
     @property
     def db_index(self) -> int:
         return settings.REDIS_DB_OTP #1
+
+    async def init(self) -> None:
+        await super().init()
+        self._issue_script = await self._load_script(ISSUE_OTP_LUA)
+        self._verify_script = await self._load_script(VERIFY_OTP_LUA)
     
     def _otp_key(self,email: EmailStr,key_prefix:str) -> str:
-        return f"{key_prefix}{email}"
+        # hash tag: the otp, its attempt counter and lockout key share one cluster slot
+        return f"{key_prefix}{{{email}}}"
+
+    def _otp_keys(self, email: EmailStr, key_prefix: str) -> list[str]:
+        key = self._otp_key(email=email, key_prefix=key_prefix)
+        return [key, f"{key}:attempts", f"{key}:lock"]
     
     # -------------------------------------------------------------------------
     # OTP operations
     # -------------------------------------------------------------------------
 
+    async def issue_otp(self, email: EmailStr, key_prefix: str, hashed_otp: str, ttl: int = settings.OTP_TTL_SECONDS) -> OTPIssueResult:
+        """Store the otp unless one is pending or the address is locked out, in one round trip"""
+        self._ensure_client()
+
+        status, remaining = await self._issue_script(keys=self._otp_keys(email, key_prefix), args=[hashed_otp, ttl]) # type: ignore
+        return OTPIssueResult(issued=int(status) == 1, locked=int(status) == -1, ttl=int(remaining))
+
+    async def verify_otp(self, email: EmailStr, key_prefix: str, hashed_otp: str) -> OTPVerifyResult:
+        """Compare and consume the otp, counting wrong codes towards a lockout, in one round trip"""
+        self._ensure_client()
+
+        status, value = await self._verify_script( # type: ignore
+            keys=self._otp_keys(email, key_prefix),
+            args=[hashed_otp, settings.OTP_MAX_ATTEMPTS, settings.OTP_LOCKOUT_SECONDS],
+        )
+        status, value = int(status), int(value)
+        if status == 1:
+            return OTPVerifyResult("ok")
+        if status == 0:
+            return OTPVerifyResult("invalid", attempts_left=value)
+        if status == -2:
+            return OTPVerifyResult("locked", retry_after=value)
+        return OTPVerifyResult("missing")
+
     async def set_otp(self, email: EmailStr, key_prefix:str,hashed_otp: str, ttl: int = settings.OTP_TTL_SECONDS) -> None:
         self._ensure_client()
     
@@ -133,13 +555,46 @@ class OTPRedisManager(BaseRedisManager):
         return ttl
 
 
+# Value left in place of an invalidated entry, reads treat it as a miss
+CACHE_TOMBSTONE = "__invalidated__"
+
+# Read path cache write that can't undo an invalidation: skipped while the entry is a
+# tombstone or already holds a newer version of the object.
+# KEYS[1] entry. ARGV[1] value, ARGV[2] its version, ARGV[3] ttl, ARGV[4] version field, ARGV[5] tombstone
+# returns 1 when written
+SET_CACHE_IF_NEWER_LUA = """
+local current = redis.call('GET', KEYS[1])
+if current == ARGV[5] then
+    return 0
+end
+if current then
+    local ok, entry = pcall(cjson.decode, current)
+    if ok and type(entry) == 'table' and tonumber(entry[ARGV[4]]) and tonumber(entry[ARGV[4]]) > tonumber(ARGV[2]) then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 1
+"""
+
+
 class CacheRedisManager(BaseRedisManager):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._set_if_newer_script: AsyncScript | None = None
+
     @property
     def db_index(self) -> int:
-        return settings.REDIS_DB_OTP #1
+        return settings.REDIS_DB_CACHE #2
+
+    async def init(self) -> None:
+        await super().init()
+        self._set_if_newer_script = await self._load_script(SET_CACHE_IF_NEWER_LUA)
     
     def _cache_key(self,resource:str,identifier_prefix:str)->str:
-        return f"{settings.CACHE_KEY}:{resource}:{identifier_prefix}"
+        # hash tag on the identifier: everything cached for one user lands on the same cluster slot
+        return f"{settings.CACHE_KEY}:{resource}:{{{identifier_prefix}}}"
     
     # -------------------------------------------------------------------------
     # Cache operations
@@ -153,7 +608,49 @@ class CacheRedisManager(BaseRedisManager):
     async def get_cache(self, resource:str,identifier_prefix:str) -> Optional[str]:
         self._ensure_client()
      
-        return await self._client.get(self._cache_key(resource=resource,identifier_prefix=identifier_prefix)) # type: ignore
+        value = await self._client.get(self._cache_key(resource=resource,identifier_prefix=identifier_prefix)) # type: ignore
+        return None if value == CACHE_TOMBSTONE else value
+
+    async def get_many_cache(self, resource:str, identifier_prefixes:list[str]) -> list[Optional[str]]:
+        """One MGET for many identifiers, values come back in the same order"""
+        values = await self.mget([self._cache_key(resource=resource,identifier_prefix=identifier) for identifier in identifier_prefixes])
+        return [None if value == CACHE_TOMBSTONE else value for value in values]
+
+    async def set_cache_if_newer(self, resource:str, identifier_prefix:str, value:str, version:int, version_field:str, ttl: int = settings.CACHE_TTL_SECONDS) -> bool:
+        """
+        Read path write of a json `value`: skipped when the entry was just invalidated
+        or holds a higher `version_field`. Returns whether it was written.
+        """
+        self._ensure_client()
+
+        return bool(await self._set_if_newer_script( # type: ignore
+            keys=[self._cache_key(resource=resource,identifier_prefix=identifier_prefix)],
+            args=[value, version, ttl, version_field, CACHE_TOMBSTONE],
+        ))
+
+    async def set_many_cache_if_newer(self, resource:str, values:dict[str,tuple[str,int]], version_field:str, ttl: int = settings.CACHE_TTL_SECONDS) -> None:
+        """set_cache_if_newer for {identifier: (value, version)}, pipelined in one round trip"""
+        self._ensure_client()
+
+        if not values:
+            return
+        async with self.pipeline() as pipe:
+            for identifier, (value, version) in values.items():
+                pipe.evalsha(self._set_if_newer_script.sha, 1, self._cache_key(resource=resource,identifier_prefix=identifier), value, version, ttl, version_field, CACHE_TOMBSTONE) # type: ignore
+
+    async def invalidate_cache(self, resource:str, identifier_prefix:str, ttl:int) -> None:
+        """Replace the entry by a tombstone for `ttl` seconds, so in flight reads can't re-cache what they loaded before"""
+        self._ensure_client()
+
+        await self._client.set(self._cache_key(resource=resource,identifier_prefix=identifier_prefix), CACHE_TOMBSTONE, ex=ttl) # type: ignore
+
+    async def set_many_cache(self, resource:str, values:dict[str,Any], ttl: int = settings.CACHE_TTL_SECONDS) -> None:
+        """Pipelined SET EX for many identifiers in one round trip"""
+        await self.mset({self._cache_key(resource=resource,identifier_prefix=identifier): value for identifier, value in values.items()}, ttl=ttl)
+
+    async def delete_many_cache(self, resource:str, identifier_prefixes:list[str]) -> int:
+        """Bulk invalidation in one round trip"""
+        return await self.mdelete([self._cache_key(resource=resource,identifier_prefix=identifier) for identifier in identifier_prefixes])
 
     async def delete_cache(self, resource:str,identifier_prefix:str):
         self._ensure_client()
@@ -164,28 +661,565 @@ class CacheRedisManager(BaseRedisManager):
         self._ensure_client()
     
         return await self._client.exists(self._cache_key(resource=resource,identifier_prefix=identifier_prefix)) == 1 # type: ignore
+
+    # -------------------------------------------------------------------------
+    # Invalidation broadcast (in-process caches on every worker)
+    # -------------------------------------------------------------------------
+
+    async def publish_invalidation(self, resource:str, identifier_prefix:str) -> None:
+        self._ensure_client()
+
+        await self._client.publish(settings.CACHE_INVALIDATION_CHANNEL, f"{resource}:{identifier_prefix}") # type: ignore
+
+    def pubsub(self) -> PubSub:
+        """Dedicated pub/sub connection, caller is responsible for closing it"""
+        self._ensure_client()
+
+        if isinstance(self._client, RedisCluster):
+            return PubSub(connection_pool=redis_pools.pubsub_pool(self._client), ignore_subscribe_messages=True)
+        return self._client.pubsub(ignore_subscribe_messages=True) # type: ignore
     
 
     
 
 
+# Rotate a refresh token atomically.
+# KEYS[1] presented token, KEYS[2] family, KEYS[3] next token. ARGV[1] ttl seconds
+# returns {1, user_id, token_version} | {-1} family revoked | {-2} unknown token | {-3} reuse detected
+ROTATE_REFRESH_TOKEN_LUA = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return {-1}
+end
+local state = redis.call('HMGET', KEYS[1], 'user_id', 'token_version', 'used')
+if not state[1] then
+    return {-2}
+end
+if state[3] == '1' then
+    redis.call('DEL', KEYS[2])
+    return {-3}
+end
+redis.call('HSET', KEYS[1], 'used', '1')
+redis.call('HSET', KEYS[3], 'user_id', state[1], 'token_version', state[2], 'used', '0')
+redis.call('EXPIRE', KEYS[3], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return {1, state[1], state[2]}
+"""
+
+
+class RefreshTokenReuseError(Exception):
+    """An already rotated refresh token was presented again, the family was revoked"""
+
+
+class RefreshTokenRedisManager(BaseRedisManager):
+    """
+    Opaque rotating refresh tokens: `<family_id>.<secret>`.
+    Only sha256(token) is stored. Every token belongs to a family (one login);
+    presenting a rotated token again revokes the whole family.
+    Keys carry the family id as a hash tag so a rotation stays slot local.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._rotate_script: AsyncScript | None = None
+
+    @property
+    def db_index(self) -> int:
+        return settings.REDIS_DB_REFRESH #3
+
+    async def init(self) -> None:
+        await super().init()
+        self._rotate_script = await self._load_script(ROTATE_REFRESH_TOKEN_LUA)
+
+    @property
+    def ttl(self) -> int:
+        return settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600
+
+    def _family_key(self, family_id: str) -> str:
+        return f"refresh:{{{family_id}}}:family"
+
+    def _token_key(self, family_id: str, token: str) -> str:
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        return f"refresh:{{{family_id}}}:{token_hash}"
+
+    @staticmethod
+    def family_of(token: str) -> Optional[str]:
+        family_id, sep, secret = token.partition(".")
+        return family_id if sep and family_id and secret else None
+
+    # -------------------------------------------------------------------------
+    # Refresh token operations
+    # -------------------------------------------------------------------------
+
+    async def issue(self, user_id: str, token_version: int) -> str:
+        """Start a new family (login) and return its first refresh token"""
+        self._ensure_client()
+
+        family_id = secrets.token_urlsafe(12)
+        token = f"{family_id}.{secrets.token_urlsafe(32)}"
+
+        async with self.pipeline(transaction=True) as pipe:
+            pipe.set(self._family_key(family_id), user_id, ex=self.ttl)
+            pipe.hset(self._token_key(family_id, token), mapping={"user_id": user_id, "token_version": token_version, "used": 0})
+            pipe.expire(self._token_key(family_id, token), self.ttl)
+        return token
+
+    async def rotate(self, token: str) -> Optional[tuple[str, int, str]]:
+        """
+        Consume `token` and return (user_id, token_version, next_token),
+        None when the token is unknown/expired/revoked.
+        Raises RefreshTokenReuseError when a rotated token is replayed.
+        """
+        self._ensure_client()
+
+        family_id = self.family_of(token)
+        if family_id is None:
+            return None
+
+        next_token = f"{family_id}.{secrets.token_urlsafe(32)}"
+        result = await self._rotate_script( # type: ignore
+            keys=[self._token_key(family_id, token), self._family_key(family_id), self._token_key(family_id, next_token)],
+            args=[self.ttl],
+        )
+        status = int(result[0])
+        if status == -3:
+            raise RefreshTokenReuseError(family_id)
+        if status != 1:
+            return None
+        return result[1], int(result[2]), next_token
+
+    async def revoke_family(self, token: str) -> None:
+        self._ensure_client()
+
+        family_id = self.family_of(token)
+        if family_id is not None:
+            await self._client.delete(self._family_key(family_id)) # type: ignore
+
+
+# Move retries that are due back onto the stream.
+# KEYS[1] retry zset, KEYS[2] stream. ARGV[1] now, ARGV[2] limit, ARGV[3] maxlen
+# members are json encoded field maps
+MOVE_DUE_RETRIES_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    local fields = cjson.decode(member)
+    -- expired ones (e.g. otps) are dropped instead of being sent again
+    if not fields['expires_at'] or tonumber(fields['expires_at']) >= tonumber(ARGV[1]) then
+        local args = {}
+        for k, v in pairs(fields) do
+            table.insert(args, k)
+            table.insert(args, v)
+        end
+        redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], '*', unpack(args))
+    end
+    redis.call('ZREM', KEYS[1], member)
+end
+return #due
+"""
+
+
+# payload fields that never go to the dead letter stream
+REDACTED_PAYLOAD_KEYS = frozenset({"otp"})
+
+
+def _redact_payload(fields: dict) -> dict:
+    try:
+        payload = json.loads(fields.get("payload") or "{}")
+    except ValueError:
+        return {**fields, "payload": "[unreadable]"}
+    for key in REDACTED_PAYLOAD_KEYS & payload.keys():
+        payload[key] = "[redacted]"
+    return {**fields, "payload": json.dumps(payload)}
+
+
+def _stream_id_before(seconds: int) -> str:
+    """Stream id of `seconds` ago, entries below it are older (ids start with the ms timestamp)"""
+    return str(int((time.time() - seconds) * 1000))
+
+
+class EmailOutboxRedisManager(BaseRedisManager):
+    """
+    Durable email outbox on a redis stream.
+    Web workers only XADD; app.workers.email_worker consumes with a consumer
+    group, retries with backoff through a sorted set and dead-letters failures.
+    Entries are deleted once handled so message bodies (otps) don't linger:
+    unhandled ones are trimmed after EMAIL_STREAM_MAX_AGE_SECONDS, retries are
+    dropped once they expire and dead letters keep no payload secrets.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._move_due_script: AsyncScript | None = None
+
+    @property
+    def db_index(self) -> int:
+        return settings.REDIS_DB_QUEUE #4
+
+    async def init(self) -> None:
+        await super().init()
+        self._move_due_script = await self._load_script(MOVE_DUE_RETRIES_LUA)
+
+    # -------------------------------------------------------------------------
+    # Producer
+    # -------------------------------------------------------------------------
+
+    async def enqueue(self, kind: str, payload: dict, expires_at: Optional[float] = None) -> str:
+        self._ensure_client()
+
+        fields = {"kind": kind, "payload": json.dumps(payload), "attempts": "0"}
+        if expires_at is not None:
+            fields["expires_at"] = str(expires_at)
+        inject_context(fields)  # the worker's send joins the enqueuing request's trace
+        return await self._client.xadd( # type: ignore
+            settings.EMAIL_STREAM_KEY, fields, maxlen=settings.EMAIL_STREAM_MAXLEN, approximate=True
+        )
+
+    # -------------------------------------------------------------------------
+    # Consumer
+    # -------------------------------------------------------------------------
+
+    async def ensure_group(self) -> None:
+        self._ensure_client()
+
+        try:
+            await self._client.xgroup_create(settings.EMAIL_STREAM_KEY, settings.EMAIL_CONSUMER_GROUP, id="0", mkstream=True) # type: ignore
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read_batch(self, consumer: str, count: int, block_ms: int) -> list[tuple[str, dict]]:
+        self._ensure_client()
+
+        response = await self._client.xreadgroup( # type: ignore
+            settings.EMAIL_CONSUMER_GROUP, consumer, {settings.EMAIL_STREAM_KEY: ">"}, count=count, block=block_ms
+        )
+        return [message for _, messages in response or [] for message in messages]
+
+    async def claim_stale(self, consumer: str, min_idle_ms: int, count: int) -> list[tuple[str, dict]]:
+        """Take over messages left pending by consumers that died mid-batch"""
+        self._ensure_client()
+
+        _, messages, *_ = await self._client.xautoclaim( # type: ignore
+            settings.EMAIL_STREAM_KEY, settings.EMAIL_CONSUMER_GROUP, consumer, min_idle_time=min_idle_ms, start_id="0-0", count=count
+        )
+        return [message for message in messages if message and message[1]]
+
+    async def ack(self, message_ids: list[str]) -> None:
+        self._ensure_client()
+
+        if not message_ids:
+            return
+        async with self.pipeline(transaction=True) as pipe:
+            pipe.xack(settings.EMAIL_STREAM_KEY, settings.EMAIL_CONSUMER_GROUP, *message_ids)
+            pipe.xdel(settings.EMAIL_STREAM_KEY, *message_ids)
+
+    async def schedule_retry(self, message_id: str, fields: dict, due_at: float) -> None:
+        self._ensure_client()
+
+        async with self.pipeline(transaction=True) as pipe:
+            pipe.zadd(settings.EMAIL_RETRY_KEY, {json.dumps(fields, sort_keys=True): due_at})
+            pipe.xack(settings.EMAIL_STREAM_KEY, settings.EMAIL_CONSUMER_GROUP, message_id)
+            pipe.xdel(settings.EMAIL_STREAM_KEY, message_id)
+
+    async def dead_letter(self, message_id: str, fields: dict, error: str) -> None:
+        self._ensure_client()
+
+        async with self.pipeline(transaction=True) as pipe:
+            pipe.xadd(settings.EMAIL_DEAD_LETTER_STREAM, {**_redact_payload(fields), "error": error[:500]}, maxlen=settings.EMAIL_STREAM_MAXLEN, approximate=True)
+            pipe.xtrim(settings.EMAIL_DEAD_LETTER_STREAM, minid=_stream_id_before(settings.EMAIL_DEAD_LETTER_MAX_AGE_SECONDS), approximate=False)
+            pipe.xack(settings.EMAIL_STREAM_KEY, settings.EMAIL_CONSUMER_GROUP, message_id)
+            pipe.xdel(settings.EMAIL_STREAM_KEY, message_id)
+
+    async def trim_stale(self) -> int:
+        """Drop outbox entries nobody handled within EMAIL_STREAM_MAX_AGE_SECONDS (workers down)"""
+        self._ensure_client()
+
+        return await self._client.xtrim( # type: ignore
+            settings.EMAIL_STREAM_KEY, minid=_stream_id_before(settings.EMAIL_STREAM_MAX_AGE_SECONDS), approximate=False  # exact, `~` can keep a whole node of old entries
+        )
+
+    async def move_due_retries(self, now: float, limit: int) -> int:
+        self._ensure_client()
+
+        return int(await self._move_due_script( # type: ignore
+            keys=[settings.EMAIL_RETRY_KEY, settings.EMAIL_STREAM_KEY],
+            args=[now, limit, settings.EMAIL_STREAM_MAXLEN],
+        ))
+
+
+# Fixed window counters for every limit of a request in one call.
+# KEYS[i] window key of limit i. ARGV[1] cost, then (amount, window seconds) per key
+# returns {count, ttl} per key, counts are only incremented when every window has room
+RATE_LIMIT_LUA = """
+local cost = tonumber(ARGV[1])
+local state = {}
+local allowed = true
+for i, key in ipairs(KEYS) do
+    local amount = tonumber(ARGV[i * 2])
+    local count = tonumber(redis.call('GET', key) or '0')
+    local ttl = redis.call('TTL', key)
+    if ttl < 0 then
+        ttl = tonumber(ARGV[i * 2 + 1])
+    end
+    if count + cost > amount then
+        allowed = false
+    end
+    state[i] = {count, ttl}
+end
+if allowed then
+    for i, key in ipairs(KEYS) do
+        state[i][1] = redis.call('INCRBY', key, cost)
+        if state[i][1] == cost then
+            redis.call('EXPIRE', key, ARGV[i * 2 + 1])
+        end
+    end
+end
+local result = {allowed and 1 or 0}
+for i = 1, #KEYS do
+    table.insert(result, state[i][1])
+    table.insert(result, state[i][2])
+end
+return result
+"""
+
+
+# Hybrid mode: reserve a batch of tokens from every window of a request.
+# KEYS[i] window key of limit i. ARGV[1] cost, then (amount, window seconds, wanted) per key
+# returns {1 | 0, then grant, count, ttl per key}. A request is only granted when every
+# window can give at least `cost`; otherwise nothing is reserved anywhere.
+LEASE_RATE_LIMIT_LUA = """
+local cost = tonumber(ARGV[1])
+local state = {}
+local allowed = true
+for i, key in ipairs(KEYS) do
+    local amount = tonumber(ARGV[i * 3 - 1])
+    local wanted = tonumber(ARGV[i * 3 + 1])
+    local count = tonumber(redis.call('GET', key) or '0')
+    local ttl = redis.call('TTL', key)
+    if ttl < 0 then
+        ttl = tonumber(ARGV[i * 3])
+    end
+    local grant = math.min(wanted, amount - count)
+    if grant < cost then
+        allowed = false
+    end
+    state[i] = {grant, count, ttl}
+end
+local result = {allowed and 1 or 0}
+for i, key in ipairs(KEYS) do
+    if allowed then
+        state[i][2] = redis.call('INCRBY', key, state[i][1])
+        if state[i][2] == state[i][1] then
+            redis.call('EXPIRE', key, ARGV[i * 3])
+        end
+    else
+        state[i][1] = 0
+    end
+    table.insert(result, state[i][1])
+    table.insert(result, state[i][2])
+    table.insert(result, state[i][3])
+end
+return result
+"""
+
+
+class RateLimitRedisManager(BaseRedisManager):
+    """Window counters for app.core.rate_limiter"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._hit_script: AsyncScript | None = None
+        self._lease_script: AsyncScript | None = None
+
+    @property
+    def db_index(self) -> int:
+        return settings.REDIS_DB_RATE_LIMIT #0
+
+    async def init(self) -> None:
+        await super().init()
+        self._hit_script = await self._load_script(RATE_LIMIT_LUA)
+        self._lease_script = await self._load_script(LEASE_RATE_LIMIT_LUA)
+
+    async def hit(self, windows: list[tuple[str, int, int]], cost: int = 1) -> tuple[bool, list[tuple[int, int]]]:
+        """
+        `windows` is [(key, amount, window_seconds)]. All keys of one call must
+        share a hash tag. Returns (allowed, [(count, seconds_to_reset)]) in the same order.
+        """
+        self._ensure_client()
+
+        args: list[int] = [cost]
+        for _, amount, window in windows:
+            args += [amount, window]
+        result = await self._hit_script(keys=[key for key, _, _ in windows], args=args) # type: ignore
+        counts = [(int(result[i]), int(result[i + 1])) for i in range(1, len(result), 2)]
+        return int(result[0]) == 1, counts
+
+    async def lease(self, windows: list[tuple[str, int, int, int]], cost: int = 1) -> tuple[bool, list[tuple[int, int, int]]]:
+        """
+        `windows` is [(key, amount, window_seconds, wanted)]. Reserves up to `wanted`
+        tokens per window. Returns (allowed, [(granted, count, seconds_to_reset)]).
+        """
+        self._ensure_client()
+
+        args: list[int] = [cost]
+        for _, amount, window, wanted in windows:
+            args += [amount, window, wanted]
+        result = await self._lease_script(keys=[key for key, _, _, _ in windows], args=args) # type: ignore
+        grants = [(int(result[i]), int(result[i + 1]), int(result[i + 2])) for i in range(1, len(result), 3)]
+        return int(result[0]) == 1, grants
+
+
+# Lockouts still in effect for an account and an (account, ip) pair. A trusted pair
+# (recent successful login from that ip) is only subject to its own lock.
+# KEYS[1] account lock, KEYS[2] pair lock, KEYS[3] pair trusted marker
+# returns the longest ttl left, 0 when not locked
+CHECK_LOGIN_LOCK_LUA = """
+local longest = redis.call('TTL', KEYS[2])
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    longest = math.max(longest, redis.call('TTL', KEYS[1]))
+end
+return math.max(longest, 0)
+"""
+
+# Count a failed password login against the account and the (account, ip) pair.
+# Failures of a trusted pair only count against the pair (the owner's typos don't lock
+# the account for everyone else, and the account lock doesn't apply to the pair anyway).
+# KEYS[1] account failures, KEYS[2] account lock, KEYS[3] pair failures, KEYS[4] pair lock, KEYS[5] pair trusted
+# ARGV[1] window, ARGV[2] account max, ARGV[3] pair max, ARGV[4] base lockout, ARGV[5] max lockout
+# returns {account failures, pair failures, lockout seconds now in effect (0 = none)}
+RECORD_LOGIN_FAILURE_LUA = """
+local window = tonumber(ARGV[1])
+local base = tonumber(ARGV[4])
+local cap = tonumber(ARGV[5])
+local trusted = redis.call('EXISTS', KEYS[5]) == 1
+local result = {}
+local longest = 0
+for i = 0, 1 do
+    local failures_key, lock_key = KEYS[i * 2 + 1], KEYS[i * 2 + 2]
+    local threshold = tonumber(ARGV[2 + i])
+    local failures
+    if i == 0 and trusted then
+        failures = tonumber(redis.call('GET', failures_key) or '0')
+    else
+        failures = redis.call('INCR', failures_key)
+        if failures == 1 then
+            redis.call('EXPIRE', failures_key, window)
+        end
+        if failures >= threshold then
+            -- every failure past the threshold doubles the lockout
+            local lockout = math.floor(math.min(base * 2 ^ math.min(failures - threshold, 30), cap))
+            redis.call('SET', lock_key, failures, 'EX', lockout)
+            -- keep counting past the lockout so the next failure backs off further
+            redis.call('EXPIRE', failures_key, lockout + window)
+            if lockout > longest then
+                longest = lockout
+            end
+        end
+    end
+    table.insert(result, failures)
+end
+table.insert(result, longest)
+return result
+"""
+
+
+class LoginFailureResult(NamedTuple):
+    account_failures: int
+    pair_failures: int
+    retry_after: int  # lockout now in effect, 0 when the next attempt is still allowed
+
+
+class LoginGuardRedisManager(BaseRedisManager):
+    """
+    Failed password login counters per account and per (account, ip).
+    The lockout is checked before argon2 runs, so an attacked account costs
+    one redis call per attempt instead of a password hash.
+
+    The account wide lock would let anyone who knows a username keep its owner
+    out, so ips the account logged in from within LOGIN_TRUSTED_IP_SECONDS
+    skip it and only have their own (account, ip) limit. Owners on a new ip
+    still wait out the account lock (or use the otp login).
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._check_script: AsyncScript | None = None
+        self._failure_script: AsyncScript | None = None
+
+    @property
+    def db_index(self) -> int:
+        return settings.REDIS_DB_RATE_LIMIT #0
+
+    async def init(self) -> None:
+        await super().init()
+        self._check_script = await self._load_script(CHECK_LOGIN_LOCK_LUA)
+        self._failure_script = await self._load_script(RECORD_LOGIN_FAILURE_LUA)
+
+    def _keys(self, account: str, ip: str) -> list[str]:
+        # account as hash tag: every key of one login lives on the same cluster slot
+        prefix = f"loginguard:{{{account}}}"
+        return [f"{prefix}:failures", f"{prefix}:lock", f"{prefix}:ip:{ip}:failures", f"{prefix}:ip:{ip}:lock", f"{prefix}:ip:{ip}:trusted"]
+
+    async def check(self, account: str, ip: str) -> int:
+        """Seconds until this account / pair may try again, 0 when not locked out"""
+        self._ensure_client()
+
+        _, account_lock, _, pair_lock, pair_trusted = self._keys(account, ip)
+        return int(await self._check_script(keys=[account_lock, pair_lock, pair_trusted])) # type: ignore
+
+    async def record_failure(self, account: str, ip: str) -> LoginFailureResult:
+        self._ensure_client()
+
+        account_failures, pair_failures, retry_after = await self._failure_script( # type: ignore
+            keys=self._keys(account, ip),
+            args=[
+                settings.LOGIN_FAILURE_WINDOW_SECONDS,
+                settings.LOGIN_MAX_FAILURES_PER_ACCOUNT,
+                settings.LOGIN_MAX_FAILURES_PER_ACCOUNT_IP,
+                settings.LOGIN_LOCKOUT_BASE_SECONDS,
+                settings.LOGIN_LOCKOUT_MAX_SECONDS,
+            ],
+        )
+        return LoginFailureResult(int(account_failures), int(pair_failures), int(retry_after))
+
+    async def record_success(self, account: str, ip: str) -> None:
+        """Forget the failures of this ip and trust it. Account wide failures age out on their own."""
+        self._ensure_client()
+
+        _, _, pair_failures, pair_lock, pair_trusted = self._keys(account, ip)
+        async with self.pipeline(transaction=True) as pipe:
+            pipe.unlink(pair_failures, pair_lock)
+            pipe.set(pair_trusted, 1, ex=settings.LOGIN_TRUSTED_IP_SECONDS)
+
+
 class RedisManager:
     """
-    Thin facade that owns both sub-managers and drives their lifecycle.
+    Thin facade that owns the sub-managers and drives their lifecycle.
     Single entry-point for the application.
     """
 
     def __init__(self) -> None:
         self.otp: OTPRedisManager = OTPRedisManager()
         self.cache: CacheRedisManager = CacheRedisManager()
+        self.refresh: RefreshTokenRedisManager = RefreshTokenRedisManager()
+        self.email_outbox: EmailOutboxRedisManager = EmailOutboxRedisManager()
+        self.rate_limit: RateLimitRedisManager = RateLimitRedisManager()
+        self.login_guard: LoginGuardRedisManager = LoginGuardRedisManager()
 
     async def init(self) -> None:
         await self.otp.init()
         await self.cache.init()
+        await self.refresh.init()
+        await self.email_outbox.init()
+        await self.rate_limit.init()
+        await self.login_guard.init()
 
     async def close(self) -> None:
         await self.otp.close()
         await self.cache.close()
+        await self.refresh.close()
+        await self.email_outbox.close()
+        await self.rate_limit.close()
+        await self.login_guard.close()
 
 
 # Singletone instance
@@ -197,18 +1231,19 @@ def get_redis_manager() -> RedisManager:
     return redis_manager
 
 def get_otp_manager() -> OTPRedisManager:
-    print("email",isinstance(redis_manager.otp,OTPRedisManager))
     return redis_manager.otp
 
 def get_cache_manager() -> CacheRedisManager:
-    print("cache",isinstance(redis_manager.otp,OTPRedisManager))
     return redis_manager.cache
 
+def get_refresh_manager() -> RefreshTokenRedisManager:
+    return redis_manager.refresh
 
+def get_email_outbox_manager() -> EmailOutboxRedisManager:
+    return redis_manager.email_outbox
 
+def get_rate_limit_manager() -> RateLimitRedisManager:
+    return redis_manager.rate_limit
 
-
-
-
-
-
+def get_login_guard_manager() -> LoginGuardRedisManager:
+    return redis_manager.login_guard
@@ -1,15 +1,33 @@
 from datetime import UTC,datetime,timedelta
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
 from pwdlib import PasswordHash
-from typing import Optional
+from pwdlib.hashers.argon2 import Argon2Hasher
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Optional, AsyncIterator
+import asyncio
+import hashlib
+import json
+import os
+import time
 import jwt
 from jwt import InvalidTokenError
+from jwt.algorithms import get_default_algorithms
 
-from app.core import get_settings
+from app.core import get_settings, ServiceOverloaded
+from app.core.metrics import PASSWORD_HASH_DURATION, PASSWORD_HASH_IN_FLIGHT, PASSWORD_HASH_QUEUED, JWT_DURATION
+from app.core.tracing import traced
 
 settings = get_settings()
 
-#password hasher + argon2 is default sec 
-password_hasher = PasswordHash.recommended()
+#password hasher + argon2 with per deployment cost parameters
+password_hasher = PasswordHash((
+    Argon2Hasher(
+        time_cost=settings.ARGON2_TIME_COST,
+        memory_cost=settings.ARGON2_MEMORY_COST,
+        parallelism=settings.ARGON2_PARALLELISM,
+    ),
+))
 
 def hash_password(password:str) -> str:
     return password_hasher.hash(password)
@@ -17,6 +35,336 @@ def hash_password(password:str) -> str:
 def verify_password(password:str,hashed_password:str) -> bool:
     return password_hasher.verify(password,hashed_password)
 
+def verify_and_update_password(password:str,hashed_password:str) -> tuple[bool, Optional[str]]:
+    """Verify and return a fresh hash when the stored one uses outdated argon2 parameters"""
+    return password_hasher.verify_and_update(password,hashed_password)
+
+
+# argon2 is cpu bound and blocks for tens of ms, so the async routes
+# hand it to a bounded pool instead of running it on the event loop
+_password_executor: Executor | None = None
+
+def get_password_executor() -> Executor:
+    """Lazily create the pool used for hashing (sized from settings)."""
+    global _password_executor
+    if _password_executor is None:
+        if settings.PASSWORD_HASH_EXECUTOR == "process":
+            _password_executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+        else:
+            _password_executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                thread_name_prefix="password-hash"
+            )
+    return _password_executor
+
+def shutdown_password_executor() -> None:
+    """Call once on shutdown to release the hashing pool."""
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=True, cancel_futures=True)
+        _password_executor = None
+
+
+
+class HashingAdmissionController:
+    """
+    Admission control for argon2 work.
+    At most `max_concurrency` jobs run at once, at most `max_queue` requests wait
+    for a slot and none waits longer than `max_queue_seconds`. Everything else is
+    shed with a 503 so the pod keeps serving cheap routes during a login storm.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, max_queue_seconds: float, retry_after: int) -> None:
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_seconds = max_queue_seconds
+        self.retry_after = retry_after
+
+        # gauges / counters
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _overloaded(self) -> ServiceOverloaded:
+        return ServiceOverloaded(retry_after=self.retry_after)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if not self._semaphore.locked():
+            # free slot, acquire() returns without suspending
+            await self._semaphore.acquire()
+        else:
+            # fail fast once the wait queue is full
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise self._overloaded()
+
+            self.queued += 1
+            PASSWORD_HASH_QUEUED.inc()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_queue_seconds)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise self._overloaded()
+            finally:
+                self.queued -= 1
+                PASSWORD_HASH_QUEUED.dec()
+
+        self.in_flight += 1
+        PASSWORD_HASH_IN_FLIGHT.inc()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            PASSWORD_HASH_IN_FLIGHT.dec()
+            self._semaphore.release()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "rejected_total": self.rejected,
+            "timed_out_total": self.timed_out,
+        }
+
+
+hashing_admission = HashingAdmissionController(
+    max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY or settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    max_queue_seconds=settings.PASSWORD_HASH_MAX_QUEUE_SECONDS,
+    retry_after=settings.PASSWORD_HASH_RETRY_AFTER_SECONDS,
+)
+
+def get_hashing_stats() -> dict[str, int]:
+    return hashing_admission.stats()
+
+# timed around the executor call so it also works with the process pool,
+# the spans also cover the wait for an admission slot
+_hash_timer = PASSWORD_HASH_DURATION.labels("hash")
+_verify_timer = PASSWORD_HASH_DURATION.labels("verify")
+
+async def hash_password_async(password:str) -> str:
+    with traced("password.hash"):
+        async with hashing_admission.slot():
+            loop = asyncio.get_running_loop()
+            with _hash_timer.time():
+                return await loop.run_in_executor(get_password_executor(), hash_password, password)
+
+async def verify_password_async(password:str,hashed_password:str) -> bool:
+    with traced("password.verify"):
+        async with hashing_admission.slot():
+            loop = asyncio.get_running_loop()
+            with _verify_timer.time():
+                return await loop.run_in_executor(get_password_executor(), verify_password, password, hashed_password)
+
+async def verify_and_update_password_async(password:str,hashed_password:str) -> tuple[bool, Optional[str]]:
+    with traced("password.verify"):
+        async with hashing_admission.slot():
+            loop = asyncio.get_running_loop()
+            with _verify_timer.time():
+                return await loop.run_in_executor(get_password_executor(), verify_and_update_password, password, hashed_password)
+
+
+# -------------------------------------------------------------------------
+# JWT signing keys
+# -------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class SigningKey:
+    kid: str
+    algorithm: str
+    signing_key: Any        # hmac secret or private key, None when verify only
+    verification_key: Any   # hmac secret or public key
+    jwk: Optional[dict]     # public jwk, None for symmetric keys (never published)
+
+
+def build_signing_key(kid:str, algorithm:str, secret:Optional[str] = None, private_pem:Optional[str] = None, public_pem:Optional[str] = None) -> SigningKey:
+    if algorithm.startswith("HS"):
+        if not secret:
+            raise RuntimeError(f"JWT key {kid!r} uses {algorithm} and needs a secret")
+        return SigningKey(kid=kid, algorithm=algorithm, signing_key=secret, verification_key=secret, jwk=None)
+
+    algo = get_default_algorithms().get(algorithm)
+    if algo is None:
+        raise RuntimeError(f"Unsupported JWT algorithm {algorithm!r}")
+    if not private_pem and not public_pem:
+        raise RuntimeError(f"JWT key {kid!r} uses {algorithm} and needs a private or public key")
+
+    private_key = algo.prepare_key(private_pem) if private_pem else None
+    public_key = algo.prepare_key(public_pem) if public_pem else private_key.public_key()  # type: ignore
+
+    jwk = algo.to_jwk(public_key, as_dict=True)
+    jwk.update({"kid": kid, "alg": algorithm, "use": "sig"})
+    return SigningKey(kid=kid, algorithm=algorithm, signing_key=private_key, verification_key=public_key, jwk=jwk)
+
+
+def _build_jwks(keys: dict[str, SigningKey]) -> tuple[bytes, str]:
+    """Serialize the public keys once, with a strong etag for conditional requests"""
+    body = json.dumps(
+        {"keys": [key.jwk for key in keys.values() if key.jwk is not None]},
+        separators=(",", ":"),
+        sort_keys=True,
+    ).encode()
+    return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def _read_pem(entry: dict, field: str) -> Optional[str]:
+    """Inline pem or a path to it (`<field>_file`), so secrets can stay mounted files"""
+    if entry.get(field):
+        return entry[field]
+    path = entry.get(f"{field}_file")
+    if path:
+        with open(path) as f:
+            return f.read()
+    return None
+
+
+# keyring entry verifying tokens that have no kid header
+LEGACY_KID = "legacy"
+
+
+@dataclass(frozen=True)
+class KeyRingState:
+    active: SigningKey
+    keys_by_kid: dict[str, SigningKey]
+    jwks_body: bytes
+    jwks_etag: str
+
+
+class KeyRing:
+    """
+    One active signing key plus any number of verification-only keys, indexed by kid.
+
+    Without JWT_KEYRING_FILE the ring holds the single key from settings. With it,
+    the file is the source of truth and is re-read when its mtime changes, so a
+    rotation never needs a restart (and never logs everybody out):
+
+        {"active": "2026-11",
+         "keys": [{"kid": "2026-11", "alg": "EdDSA", "private_key_file": "/run/secrets/jwt-2026-11.pem"},
+                  {"kid": "2026-10", "alg": "EdDSA", "public_key_file": "/run/secrets/jwt-2026-10.pub"}]}
+
+    stage   -> add the new key (published in jwks and accepted, not used for signing)
+    promote -> point "active" at it once gateways have refreshed their jwks
+    retire  -> drop the old key after TOKEN_EXPIRE_MIN has passed
+
+    Tokens without a kid header are verified with the `legacy` entry (HS256 +
+    SECRET_KEY, see LEGACY_KID) until JWT_ACCEPT_LEGACY_UNTIL. From settings it
+    is always there; in the file it is retired like any other key.
+    """
+
+    def __init__(self, path: Optional[str], reload_seconds: float) -> None:
+        self._path = path
+        self._reload_seconds = reload_seconds
+        self._mtime: Optional[float] = os.stat(path).st_mtime if path else None
+        self._next_check = 0.0
+        self._generation = 0
+        self._state = self._load()
+
+    def _load(self) -> KeyRingState:
+        if self._path:
+            with open(self._path) as f:
+                document = json.load(f)
+            keys = {}
+            for entry in document["keys"]:
+                key = build_signing_key(
+                    kid=entry["kid"],
+                    algorithm=entry.get("alg", "HS256"),
+                    secret=entry.get("secret"),
+                    private_pem=_read_pem(entry, "private_key"),
+                    public_pem=_read_pem(entry, "public_key"),
+                )
+                keys[key.kid] = key
+            active = keys.get(document["active"])
+            if active is None:
+                raise RuntimeError(f"Active JWT key {document['active']!r} is not in the keyring")
+        else:
+            private_key = settings.JWT_PRIVATE_KEY.get_secret_value() if settings.JWT_PRIVATE_KEY else None
+            active = build_signing_key(
+                kid=settings.JWT_KEY_ID,
+                algorithm=settings.ALGO,
+                secret=settings.SECRET_KEY.get_secret_value(),
+                private_pem=private_key,
+                public_pem=settings.JWT_PUBLIC_KEY,
+            )
+            keys = {active.kid: active}
+            keys.setdefault(LEGACY_KID, build_signing_key(kid=LEGACY_KID, algorithm="HS256", secret=settings.SECRET_KEY.get_secret_value()))
+
+        if active.signing_key is None:
+            raise RuntimeError(f"JWT key {active.kid!r} has no private key to sign with")
+
+        jwks_body, jwks_etag = _build_jwks(keys)
+        return KeyRingState(active=active, keys_by_kid=keys, jwks_body=jwks_body, jwks_etag=jwks_etag)
+
+    def _maybe_reload(self) -> None:
+        # at most one stat() every reload_seconds
+        if not self._path:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self._reload_seconds
+
+        try:
+            mtime = os.stat(self._path).st_mtime
+            if mtime == self._mtime:
+                return
+            state = self._load()
+        except Exception as e:
+            # keep serving with the last good keyring
+            print(f"JWT keyring reload failed, keeping previous keys: {e}")
+            return
+
+        self._mtime = mtime
+        self._state = state
+        self._generation += 1
+
+    @property
+    def state(self) -> KeyRingState:
+        self._maybe_reload()
+        return self._state
+
+    @property
+    def generation(self) -> int:
+        """Bumped on every reload, lets caches of verified tokens drop stale entries"""
+        self._maybe_reload()
+        return self._generation
+
+    @property
+    def active(self) -> SigningKey:
+        return self.state.active
+
+    def get(self, kid: str) -> Optional[SigningKey]:
+        return self.state.keys_by_kid.get(kid)
+
+
+keyring = KeyRing(path=settings.JWT_KEYRING_FILE, reload_seconds=settings.JWT_KEYRING_RELOAD_SECONDS)
+# tokens issued before kid headers existed were signed with SECRET_KEY (HS256). Anything
+# holding SECRET_KEY can mint those, so the entry stops working at JWT_ACCEPT_LEGACY_UNTIL.
+# Unset, that is one token lifetime after startup: every token issued before the
+# deploy has expired by then, and nobody is logged out by the rollout
+_legacy_until = settings.JWT_ACCEPT_LEGACY_UNTIL or datetime.now(UTC) + timedelta(minutes=settings.TOKEN_EXPIRE_MIN)
+if _legacy_until.tzinfo is None:
+    _legacy_until = _legacy_until.replace(tzinfo=UTC)
+
+
+def legacy_seconds_left() -> float:
+    """Seconds until tokens without a kid header stop verifying"""
+    return (_legacy_until - datetime.now(UTC)).total_seconds()
+
+
+def get_jwks() -> tuple[bytes, str]:
+    """Precomputed jwks document and its etag"""
+    state = keyring.state
+    return state.jwks_body, state.jwks_etag
+
+
+_jwt_encode_timer = JWT_DURATION.labels("encode")
+_jwt_decode_timer = JWT_DURATION.labels("decode")
+
 
 def create_access_token(data:dict,expires_delta:Optional[timedelta] = None) -> str:
     """Create a jwt access token"""
@@ -31,11 +379,14 @@ def create_access_token(data:dict,expires_delta:Optional[timedelta] = None) -> s
     to_encode.update({"exp":expire})
     #to_encode.update({"type": "access"})
 
-    encoded_jwt = jwt.encode(
-        to_encode,
-        settings.SECRET_KEY.get_secret_value(),
-        algorithm=settings.ALGO
-    )
+    active_key = keyring.active
+    with traced("jwt.encode", attributes={"jwt.kid": active_key.kid}), _jwt_encode_timer.time():
+        encoded_jwt = jwt.encode(
+            to_encode,
+            active_key.signing_key,
+            algorithm=active_key.algorithm,
+            headers={"kid": active_key.kid}
+        )
 
     return encoded_jwt
 
@@ -43,17 +394,21 @@ def decode_access_token(token:str) -> dict:
     """Verify a jwt access token and return the subject(user id) if valid"""
 
     try:
-       
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY.get_secret_value(),
-            algorithms=[settings.ALGO],
-            options={"require":["exp","sub","token_version"]}
-        )
+        # O(1) pick of the verification key from the kid header
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = keyring.get(kid or LEGACY_KID)
+        if key is None or (key.kid == LEGACY_KID and legacy_seconds_left() <= 0):
+            raise InvalidTokenError("Unknown key id")
+
+        with traced("jwt.decode", attributes={"jwt.kid": key.kid}), _jwt_decode_timer.time():
+            payload = jwt.decode(
+                token,
+                key.verification_key,
+                algorithms=[key.algorithm],
+                options={"require":["exp","sub","token_version"]}
+            )
         
     except InvalidTokenError as e:
         raise InvalidTokenError("Invalid token")
     else:
         return payload
-
-    
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+OpenTelemetry tracing. setup_tracing() installs the tracer provider (from
+create_app and the email worker), TracingMiddleware opens the server span per
+request from the incoming `traceparent`, and the spans below it come from:
+
+    db / redis / password hashing / jwt / email  ->  traced("...")
+
+Those are only recorded under a sampled parent (a request, an outbox message),
+so background loops don't start traces of their own. Everything is a no-op
+(a shared nullcontext) while TRACING_ENABLED is off.
+"""
+from contextlib import nullcontext
+from typing import Any, ContextManager, Optional, Sequence
+import json
+import threading
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind
+
+from app.core import get_settings
+
+settings = get_settings()
+
+TRACING_ENABLED = settings.TRACING_ENABLED
+
+tracer = trace.get_tracer("app")
+
+_NOOP: ContextManager[Any] = nullcontext()
+_provider: Optional[TracerProvider] = None
+
+
+class JsonLinesFileSpanExporter(SpanExporter):
+    """One json span per line, a local stand-in for a collector (jq / otel-desktop-viewer friendly)"""
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(json.dumps(json.loads(span.to_json(indent=None)), separators=(",", ":")) + "\n" for span in spans)
+        with self._lock:
+            self._file.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        with self._lock:
+            self._file.flush()
+        return True
+
+
+def setup_tracing(service_name: Optional[str] = None) -> None:
+    """Install the global tracer provider once per process (no-op when tracing is disabled)"""
+    global _provider
+    if not TRACING_ENABLED or _provider is not None:
+        return
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name or settings.TRACING_SERVICE_NAME}),
+        # follow the caller's sampling decision, sample our own root spans by ratio
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+    )
+    if settings.TRACING_EXPORTER == "file":
+        _provider.add_span_processor(BatchSpanProcessor(JsonLinesFileSpanExporter(settings.TRACING_FILE_PATH)))
+    elif settings.TRACING_EXPORTER == "console":
+        _provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+    trace.set_tracer_provider(_provider)
+
+
+def shutdown_tracing() -> None:
+    """Flush buffered spans on shutdown"""
+    global _provider
+    if _provider is not None:
+        _provider.shutdown()
+        _provider = None
+
+
+def traced(name: str, kind: SpanKind = SpanKind.INTERNAL, attributes: Optional[dict[str, Any]] = None) -> ContextManager[Any]:
+    """Child span of the current one, or a shared no-op context when tracing is off / there is no sampled parent"""
+    if not TRACING_ENABLED or not trace.get_current_span().is_recording():
+        return _NOOP
+    return tracer.start_as_current_span(name, kind=kind, attributes=attributes)
+
+
+def traced_from(carrier: Any, name: str, kind: SpanKind, attributes: Optional[dict[str, Any]] = None) -> ContextManager[Any]:
+    """
+    Span continuing the trace found in `carrier` (incoming headers, outbox
+    message fields), or a new root sampled by TRACING_SAMPLE_RATIO
+    """
+    if not TRACING_ENABLED:
+        return _NOOP
+    return tracer.start_as_current_span(name, context=propagate.extract(carrier), kind=kind, attributes=attributes)
+
+
+def inject_context(carrier: dict[str, str]) -> None:
+    """Add `traceparent` (and `tracestate`) of the current span to e.g. outbox message fields"""
+    if TRACING_ENABLED:
+        propagate.inject(carrier)
+
@@ -1,11 +1,32 @@
+import time
+
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine,async_sessionmaker,AsyncSession,AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core import get_settings
+from app.core.metrics import DB_POOL_CHECKOUT_WAIT, DB_POOL_IN_USE
+from app.core.tracing import TRACING_ENABLED, tracer
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
 
 settings = get_settings()
 
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Records how long each checkout waited for a connection (incl. opening a new one)"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
 engine:AsyncEngine = create_async_engine(
     settings.DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
     pool_pre_ping=True,
     echo=True,
     future=True,
@@ -16,9 +37,48 @@ engine:AsyncEngine = create_async_engine(
     }
 )
 
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    DB_POOL_IN_USE.inc()
+
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record) -> None:
+    DB_POOL_IN_USE.dec()
+
+
+if TRACING_ENABLED:
+    # one client span per statement; get_db sessions run these inside the request's
+    # span because sqlalchemy's greenlets carry the caller's contextvars
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _start_sql_span(conn, cursor, statement, parameters, context, executemany) -> None:
+        if not trace.get_current_span().is_recording():
+            return
+        context._otel_span = tracer.start_span(
+            statement.split(None, 1)[0].upper() if statement else "SQL",
+            kind=SpanKind.CLIENT,
+            attributes={"db.system": "postgresql", "db.statement": statement[:1000], "db.executemany": executemany},
+        )
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _end_sql_span(conn, cursor, statement, parameters, context, executemany) -> None:
+        span = getattr(context, "_otel_span", None)
+        if span is not None:
+            span.end()
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _fail_sql_span(exception_context) -> None:
+        span = getattr(exception_context.execution_context, "_otel_span", None)
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            span.set_status(Status(StatusCode.ERROR))
+            span.end()
+
+
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
     class_=AsyncSession,
     autoflush=False,
     autocommit=False
-)
\ No newline at end of file
+)
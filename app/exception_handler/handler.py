@@ -13,7 +13,8 @@ async def app_exception_handler(request:Request,exc:AppException)->JSONResponse:
             error_code=exc.error_code,
             message=exc.message,
             details=exc.details
-        ).model_dump(exclude_none=True)
+        ).model_dump(exclude_none=True),
+        headers=exc.headers or None
     )
 async def http_exception_handler(request: Request, exc: HTTPException)->JSONResponse:
     return JSONResponse(
@@ -1,23 +1,16 @@
 from fastapi import Request, status
 from fastapi.responses import JSONResponse
-from slowapi.errors import RateLimitExceeded
+
+from app.core import RateLimitExceeded
 
 from app.schemas import ErrorResponse
 from app.utils import add_duration
 
 async def rate_limit_exceeded_handler(request: Request,exc: RateLimitExceeded) -> JSONResponse:
-    #print("Rate limit exceeded")
-
-    #print(exc)
-    
-    parts = exc.detail.split(" per ")  #10 per 1 minute --> 10 , 1 minute
-    retry_after = str(parts[1].strip())
-    retry_limit = str(parts[0].strip())
-
+    retry_after = str(exc.retry_after)
 
     #calculating reset at time values
-    reset_at = add_duration(retry_after)
-    #print(f"{reset_at}")
+    reset_at = add_duration(f"{exc.retry_after} seconds")
 
     response =  JSONResponse(
         status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -33,8 +26,8 @@ async def rate_limit_exceeded_handler(request: Request,exc: RateLimitExceeded) -
     )
 
     response.headers["Retry-After"] = retry_after
-    response.headers["X-RateLimit-Limit"] = retry_limit
-    response.headers["X-RateLimit-Remaning"] = "0"
+    response.headers["X-RateLimit-Limit"] = str(exc.limit.amount)
+    response.headers["X-RateLimit-Remaining"] = "0"
 
     return response
 
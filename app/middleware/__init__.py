@@ -1,5 +1,9 @@
+from .metrics_middleware import MetricsMiddleware
+from .profiling_middleware import ProfilingMiddleware
+from .tracing_middleware import TracingMiddleware
+
 # from .global_exception_handler import UnhandledExceptionMiddleware
 
 # __all__ = [
 #     "UnhandledExceptionMiddleware"
-# ]
\ No newline at end of file
+# ]
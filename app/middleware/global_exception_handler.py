@@ -1,9 +1,8 @@
 from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi import Request,status
 from fastapi.exceptions import RequestValidationError
-from slowapi.errors import RateLimitExceeded
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from app.core import AppException
+from app.core import AppException, RateLimitExceeded
 from fastapi.responses import JSONResponse
 from app.schemas import ErrorResponse
 
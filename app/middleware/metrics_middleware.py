@@ -0,0 +1,47 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import HTTP_REQUESTS, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_PROGRESS
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware counting and timing every http request per route
+    template (`/api/v1/users/{user_id}`, not the raw path). Requests that
+    matched no route are grouped under `unmatched`.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._timers: dict[tuple[str, str], object] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500  # nothing was sent, the app raised
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+
+            # fastapi puts the matched route in the scope while routing
+            route = getattr(scope.get("route"), "path_format", None) or "unmatched"
+            method = scope["method"]
+            timer = self._timers.get((method, route))
+            if timer is None:
+                timer = self._timers[(method, route)] = HTTP_REQUEST_DURATION.labels(method, route)
+            timer.observe(elapsed)  # type: ignore[attr-defined]
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
@@ -0,0 +1,68 @@
+import asyncio
+import hmac
+import random
+import time
+import uuid
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import get_settings
+from app.core.profiler import RequestProfiler, write_folded
+
+settings = get_settings()
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware sampling a request end to end (middlewares,
+    dependencies like get_current_user, db / redis awaits, the endpoint).
+    A request is profiled when it carries `X-Profile: <PROFILING_TOKEN>` or
+    is picked by PROFILING_SAMPLE_RATE. The response gets an X-Profile-Id
+    header naming the .folded file written to PROFILING_DIR.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.active = 0
+
+    def _wanted(self, scope: Scope) -> bool:
+        if self.active >= settings.PROFILING_MAX_CONCURRENT:
+            return False
+        if settings.PROFILING_TOKEN is not None:
+            token = Headers(scope=scope).get("x-profile")
+            if token and hmac.compare_digest(token.encode(), settings.PROFILING_TOKEN.get_secret_value().encode()):
+                return True
+        return settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            await send(message)
+
+        self.active += 1
+        profiler = RequestProfiler(asyncio.current_task(), interval=settings.PROFILING_INTERVAL_MS / 1000)  # type: ignore[arg-type]
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            samples = profiler.stop()
+            self.active -= 1
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            route = getattr(scope.get("route"), "path_format", None) or scope["path"]
+            slug = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+            name = f"{int(time.time())}-{scope['method']}-{slug}-{elapsed_ms:.0f}ms-{profile_id}"
+            try:
+                path = await asyncio.get_running_loop().run_in_executor(None, write_folded, samples, name)
+                print(f"Profile {profile_id}: {sum(samples.values())} samples, {elapsed_ms:.1f} ms -> {path}")
+            except OSError as e:
+                print(f"Profile {profile_id} could not be written: {e!r}")
@@ -0,0 +1,50 @@
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import traced_from
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening the server span of every http request. An
+    incoming W3C `traceparent` header makes it a child of the caller's trace
+    (and keeps the caller's sampling decision). The span is named after the
+    route template once routing is done, and sampled requests get their trace
+    id back in `X-Trace-Id`.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        method = scope["method"]
+        attributes = {"http.request.method": method, "url.path": scope["path"]}
+
+        with traced_from(headers, method, SpanKind.SERVER, attributes) as span:
+            span_context = span.get_span_context()
+
+            async def send_with_trace_id(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    span.set_attribute("http.response.status_code", status_code)
+                    if status_code >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                    if span_context.trace_flags.sampled:
+                        MutableHeaders(scope=message)["X-Trace-Id"] = trace.format_trace_id(span_context.trace_id)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                # fastapi puts the matched route in the scope while routing
+                route = getattr(scope.get("route"), "path_format", None)
+                if route:
+                    span.update_name(f"{method} {route}")
+                    span.set_attribute("http.route", route)
@@ -1,4 +1,4 @@
-from .error_response import ErrorResponse,HealthResponse
-from .auth import Token,TokenPayload,NewPswdPayload
+from .error_response import ErrorResponse,HealthResponse,HealthStatsResponse
+from .auth import Token,TokenPayload,NewPswdPayload,Principal,RefreshTokenRequest,IntrospectionRequest,IntrospectionResult,IntrospectionResponse,OTPVerifyRequest,OTPLoginRequest,OTPLoginVerify
 from .users import UserPrivateResponse,UserPublicResponse,UserCreate,UserRole,UserUpdate
 from .common import ApiResponse
\ No newline at end of file
@@ -1,12 +1,54 @@
-from pydantic import BaseModel, Field,model_validator
-from typing import Literal
+from pydantic import BaseModel, ConfigDict, EmailStr, Field,model_validator
+from typing import Literal, Optional
+from uuid import UUID
+from datetime import datetime
 from app.utils import StrongPassword
 from app.core import BusinessRuleViolation
+from .users import UserRole
 
 
 class Token(BaseModel):
     access_token: str
     token_type: Literal["bearer"]
+    refresh_token: Optional[str] = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str = Field(min_length=1, max_length=256)
+
+
+OTPCode = Field(pattern=r"^\d{6}$")
+
+
+class OTPVerifyRequest(BaseModel):
+    otp: str = OTPCode
+
+
+class OTPLoginRequest(BaseModel):
+    email: EmailStr = Field(max_length=120)
+
+
+class OTPLoginVerify(OTPLoginRequest):
+    otp: str = OTPCode
+
+
+class IntrospectionRequest(BaseModel):
+    tokens: list[str] = Field(min_length=1, max_length=100)
+
+
+class IntrospectionResult(BaseModel):
+    """RFC 7662 style, inactive tokens are just {"active": false}"""
+    active: bool
+    sub: Optional[str] = None
+    username: Optional[str] = None
+    exp: Optional[int] = None
+    token_type: Optional[str] = None
+    role: Optional[UserRole] = None
+    is_verified: Optional[bool] = None
+
+
+class IntrospectionResponse(BaseModel):
+    results: list[IntrospectionResult]
 
 
 class TokenPayload(BaseModel):
@@ -15,6 +57,23 @@ class TokenPayload(BaseModel):
     exp: int
 
 
+class Principal(BaseModel):
+    """Compact, cacheable view of the authenticated user (never holds the password hash)."""
+    id: UUID
+    username: str
+    email: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    phone_number: Optional[str] = None
+    is_active: bool
+    is_verified: bool
+    role: UserRole
+    token_version: int
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class NewPswdPayload(BaseModel):
     current_password: str = Field(min_length=8, max_length=20)
     new_password: StrongPassword
@@ -8,4 +8,12 @@ class ErrorResponse(BaseModel):
 
 
 class HealthResponse(BaseModel):
-    status:str
\ No newline at end of file
+    status:str
+
+
+class HealthStatsResponse(BaseModel):
+    hashing:dict[str,int]
+    principal_cache:dict[str,int]
+    token_cache:dict[str,int]
+    redis_pools:dict[str,dict[str,float]]
+    rate_limit:dict[str,int]
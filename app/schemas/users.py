@@ -59,6 +59,7 @@ class UserPrivateResponse(UserPublicResponse):
 
     # status
     is_active: bool
+    is_verified: bool = False
     role: UserRole = UserRole.user
 
     # Timestamp
@@ -1 +1 @@
-from .email_services import send_otp_email
\ No newline at end of file
+from .email_services import send_otp_email,enqueue_otp_email,get_smtp_pool_stats,close_smtp_pool
\ No newline at end of file
@@ -1,30 +1,175 @@
-from fastapi_mail import FastMail, MessageSchema, MessageType, ConnectionConfig, NameEmail
+from collections import deque
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import AsyncIterator
+import asyncio
+import math
+import statistics
+import time
 
-from app.core import get_settings
+import aiosmtplib
+from fastapi_mail import NameEmail
+
+from app.core import get_settings, EmailOutboxRedisManager
+from app.core.metrics import EMAIL_SENDS, EMAIL_SEND_DURATION
+from app.core.tracing import traced
 
 settings = get_settings()
 
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.MAIL_USERNAME,
-    MAIL_PASSWORD=settings.MAIL_PASSWORD,
-    MAIL_FROM=settings.MAIL_FROM,
-    MAIL_PORT=settings.MAIL_PORT,
-    MAIL_SERVER=settings.SMTP_HOST,
-    MAIL_FROM_NAME=settings.MAIL_FROM_NAME,
-    MAIL_STARTTLS=settings.MAIL_STARTTLS,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    MAIL_SSL_TLS=settings.MAIL_SSL_TLS
-)
+class _TrackedSMTP(aiosmtplib.SMTP):
+    """Remembers whether the current transaction got as far as DATA"""
+
+    data_started = False
+
+    async def data(self, *args, **kwargs):
+        self.data_started = True
+        return await super().data(*args, **kwargs)
+
+
+class _PooledConnection:
+    def __init__(self, client: _TrackedSMTP) -> None:
+        self.client = client
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """
+    Keeps authenticated smtp sessions open between messages so a burst of
+    mails doesn't pay TCP + TLS + AUTH for each one.
+
+    - at most SMTP_POOL_SIZE sessions are in use at once (callers wait for a slot)
+    - idle sessions past SMTP_POOL_MAX_IDLE_SECONDS or SMTP_POOL_MAX_MESSAGES_PER_CONNECTION are reopened
+    - a session the server dropped before DATA is reconnected and the message sent once more;
+      a disconnect during DATA is raised instead (the server may have accepted the message,
+      the outbox retry decides), so the pool itself never sends a mail twice
+    """
+
+    def __init__(self, size: int) -> None:
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list[_PooledConnection] = []
+
+        self._latencies_ms: deque[float] = deque(maxlen=1000)
+        self.sent = 0
+        self.failed = 0
+        self.connections_opened = 0
+        self.reconnects = 0
+
+    async def _connect(self) -> _PooledConnection:
+        client = _TrackedSMTP(
+            hostname=settings.SMTP_HOST,
+            port=settings.MAIL_PORT,
+            use_tls=settings.MAIL_SSL_TLS,
+            start_tls=settings.MAIL_STARTTLS and not settings.MAIL_SSL_TLS,
+            validate_certs=True,
+            timeout=settings.SMTP_TIMEOUT_SECONDS,
+        )
+        await client.connect()
+        await client.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD.get_secret_value())
+        self.connections_opened += 1
+        return _PooledConnection(client)
+
+    async def _discard(self, conn: _PooledConnection) -> None:
+        try:
+            await conn.client.quit()
+        except Exception:
+            conn.client.close()  # already gone, just drop the transport
+
+    def _reusable(self, conn: _PooledConnection) -> bool:
+        return (
+            conn.client.is_connected
+            and time.monotonic() - conn.last_used < settings.SMTP_POOL_MAX_IDLE_SECONDS
+            and conn.messages_sent < settings.SMTP_POOL_MAX_MESSAGES_PER_CONNECTION
+        )
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[_PooledConnection]:
+        async with self._slots:
+            conn = None
+            # most recently used first, it is the one least likely to have been dropped
+            while self._idle and conn is None:
+                candidate = self._idle.pop()
+                if self._reusable(candidate):
+                    conn = candidate
+                else:
+                    await self._discard(candidate)
+            if conn is None:
+                conn = await self._connect()
+
+            try:
+                yield conn
+            except BaseException:
+                await self._discard(conn)
+                raise
+            conn.last_used = time.monotonic()
+            self._idle.append(conn)
 
+    async def send(self, message: EmailMessage) -> None:
+        start = time.perf_counter()
+        try:
+            async with self._connection() as conn:
+                try:
+                    conn.client.data_started = False
+                    await conn.client.send_message(message)
+                except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError):
+                    if conn.client.data_started:
+                        raise
+                    # server closed the idle session under us before the message went out, reopen once and resend
+                    self.reconnects += 1
+                    conn.client.close()
+                    fresh = await self._connect()
+                    conn.client, conn.messages_sent = fresh.client, 0
+                    await conn.client.send_message(message)
+                conn.messages_sent += 1
+        except Exception:
+            self.failed += 1
+            EMAIL_SENDS.labels("failed").inc()
+            raise
 
-async def send_otp_email(email: NameEmail, otp: str, retries: int = 3, delay: int = 5):
+        elapsed = time.perf_counter() - start
+        self.sent += 1
+        self._latencies_ms.append(elapsed * 1000)
+        EMAIL_SENDS.labels("sent").inc()
+        EMAIL_SEND_DURATION.observe(elapsed)
 
-    message = MessageSchema(
-        subject="Your OTP Code",
-        recipients=[email],
-        body=f"""
+    async def close(self) -> None:
+        while self._idle:
+            await self._discard(self._idle.pop())
+
+    def stats(self) -> dict[str, float]:
+        latencies = sorted(self._latencies_ms)
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "connections_opened": self.connections_opened,
+            "reconnects": self.reconnects,
+            "idle_connections": len(self._idle),
+            "latency_ms_p50": round(statistics.median(latencies), 2) if latencies else 0.0,
+            "latency_ms_p95": round(latencies[math.ceil(len(latencies) * 0.95) - 1], 2) if latencies else 0.0,
+            "latency_ms_max": round(latencies[-1], 2) if latencies else 0.0,
+        }
+
+
+smtp_pool = SMTPConnectionPool(size=settings.SMTP_POOL_SIZE)
+
+
+def get_smtp_pool_stats() -> dict[str, float]:
+    return smtp_pool.stats()
+
+
+async def close_smtp_pool() -> None:
+    await smtp_pool.close()
+
+
+async def send_otp_email(email: NameEmail, otp: str) -> None:
+
+    message = EmailMessage()
+    message["Subject"] = "Your OTP Code"
+    message["From"] = formataddr((settings.MAIL_FROM_NAME, settings.MAIL_FROM))
+    message["To"] = formataddr((email.name, email.email))
+    message.set_content(f"""
             Hello {email.name},
 
             Your OTP is: {otp}
@@ -32,23 +177,20 @@ async def send_otp_email(email: NameEmail, otp: str, retries: int = 3, delay: in
             This code is valid for 5 minutes.
 
             If you did not request this, ignore this email.
-            """,
-        subtype=MessageType.plain,
-    )
+            """)
+
+    with traced("email.send_otp", attributes={"email.kind": "otp"}):
+        await smtp_pool.send(message)
 
-    fm = FastMail(config=conf)
-    await fm.send_message(message=message)
-
-    # for attempt in range(1, retries+1):
-    #     try:
-    #         await fm.send_message(message=message)
-    #         return
-    #     except (ConnectionErrors) as e:
-
-    #         if attempt <= retries:
-    #             await asyncio.sleep(delay)  # retry after sleep for some time
-    #         else:
-    #             raise HTTPException(
-    #                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-    #                 detail="Error sending email"
-    #             )
+
+# -------------------------------------------------------------------------
+# Outbox producers (web workers only enqueue, app.workers.email_worker sends)
+# -------------------------------------------------------------------------
+
+async def enqueue_otp_email(outbox: EmailOutboxRedisManager, email: NameEmail, otp: str) -> str:
+    """Queue an otp mail, it is dropped by the worker once the otp itself has expired"""
+    return await outbox.enqueue(
+        kind="otp",
+        payload={"name": email.name, "email": email.email, "otp": otp},
+        expires_at=time.time() + settings.OTP_TTL_SECONDS,
+    )
@@ -1,3 +1,3 @@
 from .add_duration import add_duration
 from .common import StrongPassword,PhoneNumber
-from .otp_util import generate_otp,hash_otp,verify_otp
+from .otp_util import generate_otp,hash_otp,verify_otp,otp_verification_error
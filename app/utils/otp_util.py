@@ -3,8 +3,9 @@ import string
 import hmac
 import hashlib
 from pydantic import EmailStr
+from fastapi import HTTPException, status
 
-from app.core import get_settings
+from app.core import get_settings, OTPVerifyResult
 
 settings = get_settings()
 
@@ -29,3 +30,16 @@ def hash_otp(otp:str) -> str:
 
 def verify_otp(plain_otp:str,hashed_otp:str) -> bool:
     return hmac.compare_digest(hash_otp(plain_otp),hashed_otp)
+
+
+def otp_verification_error(result: OTPVerifyResult, status_code: int = status.HTTP_400_BAD_REQUEST) -> HTTPException:
+    """Map a failed OTPRedisManager.verify_otp result to the response the client gets"""
+    if result.status == "locked":
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many wrong codes. Please try again later.",
+            headers={"Retry-After": str(result.retry_after)}
+        )
+    if result.status == "invalid":
+        return HTTPException(status_code=status_code, detail=f"Invalid OTP, {result.attempts_left} attempts left")
+    return HTTPException(status_code=status_code, detail="OTP expired or not requested")
@@ -0,0 +1,149 @@
+"""
+Email delivery worker, runs separately from the web workers:
+
+    python -m app.workers.email_worker
+
+Consumes the outbox stream with a consumer group (run as many replicas as
+needed), sends in batches, retries failures with exponential backoff and
+dead-letters messages after EMAIL_MAX_ATTEMPTS.
+"""
+import asyncio
+import json
+import os
+import signal
+import socket
+import time
+from typing import Awaitable, Callable
+
+from fastapi_mail import NameEmail
+from opentelemetry.trace import SpanKind
+from prometheus_client import start_http_server
+
+from app.core import get_settings, EmailOutboxRedisManager, setup_tracing, shutdown_tracing, traced_from
+from app.core.metrics import EMAIL_OUTBOX_MESSAGES, metrics_registry
+from app.services import send_otp_email, get_smtp_pool_stats, close_smtp_pool
+
+settings = get_settings()
+
+
+async def _send_otp(payload: dict) -> None:
+    await send_otp_email(NameEmail(name=payload["name"], email=payload["email"]), payload["otp"])
+
+
+# message kind -> sender
+EMAIL_HANDLERS: dict[str, Callable[[dict], Awaitable[None]]] = {
+    "otp": _send_otp,
+}
+
+
+class EmailWorker:
+
+    def __init__(self, outbox: EmailOutboxRedisManager, consumer: str) -> None:
+        self.outbox = outbox
+        self.consumer = consumer
+        self._stopping = asyncio.Event()
+        self._send_slots = asyncio.Semaphore(settings.EMAIL_SEND_CONCURRENCY)
+        self._next_claim = 0.0
+        self._next_stats = time.monotonic() + settings.EMAIL_STATS_LOG_SECONDS
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _backoff(self, attempts: int) -> float:
+        return min(settings.EMAIL_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), settings.EMAIL_RETRY_MAX_SECONDS)
+
+    async def _handle(self, message_id: str, fields: dict) -> str | None:
+        """Send one message. Returns the id to ack on success, None when it was rescheduled/dead-lettered."""
+        expires_at = fields.get("expires_at")
+        if expires_at and float(expires_at) < time.time():
+            EMAIL_OUTBOX_MESSAGES.labels("expired").inc()
+            return message_id  # e.g. otp already expired, nothing useful to deliver
+
+        handler = EMAIL_HANDLERS.get(fields.get("kind", ""))
+        if handler is None:
+            await self.outbox.dead_letter(message_id, fields, error=f"unknown kind {fields.get('kind')!r}")
+            EMAIL_OUTBOX_MESSAGES.labels("dead_lettered").inc()
+            return None
+
+        try:
+            async with self._send_slots:
+                # child of the request that enqueued it (traceparent field), if it was traced
+                with traced_from(fields, f"email.outbox {fields['kind']}", SpanKind.CONSUMER, {"messaging.message.id": message_id, "email.attempts": fields.get("attempts", "0")}):
+                    await handler(json.loads(fields["payload"]))
+            EMAIL_OUTBOX_MESSAGES.labels("delivered").inc()
+            return message_id
+        except Exception as e:
+            attempts = int(fields.get("attempts", "0")) + 1
+            due_at = time.time() + self._backoff(attempts)
+            if expires_at and due_at > float(expires_at):
+                # would be expired by the next attempt, don't keep it (and its otp) around
+                EMAIL_OUTBOX_MESSAGES.labels("expired").inc()
+                return message_id
+            if attempts >= settings.EMAIL_MAX_ATTEMPTS:
+                print(f"email {message_id} dead-lettered after {attempts} attempts: {e!r}")
+                await self.outbox.dead_letter(message_id, fields, error=repr(e))
+                EMAIL_OUTBOX_MESSAGES.labels("dead_lettered").inc()
+            else:
+                await self.outbox.schedule_retry(message_id, {**fields, "attempts": str(attempts)}, due_at=due_at)
+                EMAIL_OUTBOX_MESSAGES.labels("retried").inc()
+            return None
+
+    async def _process(self, messages: list[tuple[str, dict]]) -> None:
+        results = await asyncio.gather(*(self._handle(message_id, fields) for message_id, fields in messages))
+        # one XACK/XDEL for the whole batch
+        await self.outbox.ack([message_id for message_id in results if message_id])
+
+    async def run(self) -> None:
+        await self.outbox.ensure_group()
+        print(f"Email worker {self.consumer} started")
+
+        while not self._stopping.is_set():
+            try:
+                await self.outbox.move_due_retries(now=time.time(), limit=settings.EMAIL_BATCH_SIZE)
+
+                now = time.monotonic()
+                if now >= self._next_claim:
+                    self._next_claim = now + settings.EMAIL_CLAIM_IDLE_SECONDS
+                    await self.outbox.trim_stale()
+                    stale = await self.outbox.claim_stale(self.consumer, min_idle_ms=settings.EMAIL_CLAIM_IDLE_SECONDS * 1000, count=settings.EMAIL_BATCH_SIZE)
+                    if stale:
+                        await self._process(stale)
+
+                messages = await self.outbox.read_batch(self.consumer, count=settings.EMAIL_BATCH_SIZE, block_ms=1000)
+                if messages:
+                    await self._process(messages)
+
+                if settings.EMAIL_STATS_LOG_SECONDS and now >= self._next_stats:
+                    self._next_stats = now + settings.EMAIL_STATS_LOG_SECONDS
+                    print(f"Email worker {self.consumer} smtp: {get_smtp_pool_stats()}")
+            except Exception as e:
+                # redis hiccup, pending messages are picked up again later
+                print(f"Email worker loop error: {e!r}")
+                await asyncio.sleep(1)
+
+        print(f"Email worker {self.consumer} stopped, smtp: {get_smtp_pool_stats()}")
+
+
+async def main() -> None:
+    if settings.EMAIL_WORKER_METRICS_PORT:
+        start_http_server(settings.EMAIL_WORKER_METRICS_PORT, registry=metrics_registry())
+    setup_tracing(f"{settings.TRACING_SERVICE_NAME}-email-worker")
+
+    outbox = EmailOutboxRedisManager()
+    await outbox.init()
+
+    worker = EmailWorker(outbox, consumer=f"{socket.gethostname()}-{os.getpid()}")
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await close_smtp_pool()
+        await outbox.close()
+        shutdown_tracing()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,16 @@
+"""
+Placeholder settings for the bench scripts, so they run on a laptop without
+the full stack. Import it before anything from `app`; values already in the
+environment / .env win.
+"""
+import os
+
+for name, value in {
+    "DB_USER": "bench", "DB_PASSWORD": "bench", "DB_HOST": "localhost", "DB_PORT": "5432", "DB_NAME": "bench",
+    "REDIS_HOST": "localhost", "REDIS_PORT": "6379",
+    "RATE_LIMIT_DEFAULT": "100/minute", "RATE_LIMIT_ENABLED": "false",
+    "SECRET_KEY": "bench-secret-key-bench-secret-key-0123", "MAIL_USERNAME": "bench@example.com",
+    "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "OTP_KEY_VERIFY": "verify:", "OTP_KEY_LOGIN": "login:", "CACHE_KEY": "cache",
+}.items():
+    os.environ.setdefault(name, value)
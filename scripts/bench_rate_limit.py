@@ -0,0 +1,89 @@
+"""
+Benchmark: limiter strategy "redis" (one script call per check) vs "hybrid"
+(local leases, redis once per batch) against a real redis.
+
+    docker compose -f docker-compose.dev.yml up -d redis
+    python -m scripts.bench_rate_limit --requests 20000 --clients 50 --limit "1000/minute"
+
+Prints redis round trips per request, throughput and how many requests each
+strategy let through (hybrid may reject a little early, never late).
+Uses REDIS_HOST/REDIS_PORT from the environment / .env (defaults to
+localhost:6379) and only touches ratelimit:{bench-*} keys.
+"""
+import argparse
+import asyncio
+import time
+
+from scripts import _bench_env  # noqa: F401  (placeholder settings, before any app import)
+
+from limits import parse_many  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from app.core import RateLimitExceeded, get_rate_limit_manager  # noqa: E402
+from app.core.rate_limiter import Limiter  # noqa: E402
+
+
+def fake_request(client: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/bench", "headers": [], "client": (client, 0)})
+
+
+async def run_strategy(strategy: str, requests: int, clients: int, limit: str, error: float, concurrency: int) -> None:
+    limiter = Limiter(key_func=lambda request: request.client.host, default_limits=[], strategy=strategy, hybrid_error=error)  # type: ignore[arg-type]
+    items = parse_many(limit)
+    scope = f"bench-{strategy}-{time.time_ns()}"
+    allowed = rejected = 0
+
+    async def one(i: int) -> None:
+        nonlocal allowed, rejected
+        try:
+            await limiter.hit(fake_request(f"bench-{i % clients}"), items, scope)
+            allowed += 1
+        except RateLimitExceeded:
+            rejected += 1
+
+    slots = asyncio.Semaphore(concurrency)
+
+    async def bounded(i: int) -> None:
+        async with slots:
+            await one(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{strategy:<7}: {limiter.redis_calls / requests:6.3f} redis ops/request"
+        f"  {elapsed / requests * 1e6:8.1f} us/request  ({requests / elapsed:10,.0f} req/s)"
+        f"  allowed {allowed}, rejected {rejected}"
+    )
+
+
+async def run(requests: int, clients: int, limit: str, error: float, concurrency: int) -> None:
+    manager = get_rate_limit_manager()
+    await manager.init()
+    try:
+        amount = parse_many(limit)[0].amount
+        print(f"{requests} requests, {clients} clients, limit {limit} (at most {min(requests, clients * amount)} allowed), error {error}\n")
+        for strategy in ("redis", "hybrid"):
+            await run_strategy(strategy, requests, clients, limit, error, concurrency)
+    finally:
+        client = manager.get_client()
+        keys = [key async for key in client.scan_iter(match="ratelimit:{bench-*")]
+        if keys:
+            await manager.mdelete(keys)
+        await manager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Redis ops/request of the redis vs hybrid rate limit strategies")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--limit", default="1000/minute")
+    parser.add_argument("--error", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.clients, args.limit, args.error, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: one command per await vs the batch APIs on BaseRedisManager
+(MSET/MGET/UNLINK and pipelined SET EX) against a real redis.
+
+    docker compose -f docker-compose.dev.yml up -d redis
+    python -m scripts.bench_redis_pipeline --keys 1000 --rounds 5
+
+Uses REDIS_HOST/REDIS_PORT from the environment / .env (defaults to
+localhost:6379) and only touches keys under the bench: prefix of the cache db.
+"""
+import argparse
+import asyncio
+import time
+
+from scripts import _bench_env  # noqa: F401  (placeholder settings, before any app import)
+
+from app.core import CacheRedisManager  # noqa: E402
+
+
+async def timed(label: str, n: int, rounds: int, fn) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<28}: {best * 1000:9.2f} ms  ({n / best:12,.0f} keys/s)")
+    return best
+
+
+async def run(n: int, rounds: int, ttl: int) -> None:
+    manager = CacheRedisManager()
+    await manager.init()
+    client = manager.get_client()
+
+    keys = [f"bench:{i}" for i in range(n)]
+    values = {key: f"value-{key}" for key in keys}
+
+    async def sequential_set():
+        for key, value in values.items():
+            await client.set(key, value, ex=ttl)
+
+    async def sequential_get():
+        for key in keys:
+            await client.get(key)
+
+    async def sequential_delete():
+        for key in keys:
+            await client.delete(key)
+
+    try:
+        print(f"keys per round: {n}, best of {rounds}\n")
+        results = [
+            (await timed("sequential SET EX", n, rounds, sequential_set),
+             await timed("mset (pipelined SET EX)", n, rounds, lambda: manager.mset(values, ttl=ttl))),
+            (await timed("sequential GET", n, rounds, sequential_get),
+             await timed("mget (MGET)", n, rounds, lambda: manager.mget(keys))),
+        ]
+        # deletes need the keys back each round
+        seq_del = await timed("sequential DEL", n, 1, sequential_delete)
+        await manager.mset(values, ttl=ttl)
+        batch_del = await timed("mdelete (UNLINK)", n, 1, lambda: manager.mdelete(keys))
+        results.append((seq_del, batch_del))
+
+        print()
+        for label, (sequential, batched) in zip(("set", "get", "delete"), results):
+            print(f"{label:<6} speedup: {sequential / batched:6.1f}x")
+    finally:
+        await manager.mdelete(keys)
+        await manager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sequential vs pipelined redis throughput")
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--ttl", type=int, default=60)
+    args = parser.parse_args()
+    asyncio.run(run(args.keys, args.rounds, args.ttl))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Microbenchmark: per-request cost of authenticating a bearer token with and
+without the verified-token cache.
+
+    python -m scripts.bench_token_cache --iterations 50000
+
+Uses the settings from the environment / .env; placeholders are filled in
+for anything missing so it also runs on a laptop without the full stack.
+"""
+import argparse
+import timeit
+
+from scripts import _bench_env  # noqa: F401  (placeholder settings, before any app import)
+
+from uuid import uuid4  # noqa: E402
+
+from app.core import create_access_token  # noqa: E402
+from app.core.dependencies import verify_token, verify_token_cached, token_cache  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verified token cache microbenchmark")
+    parser.add_argument("--iterations", type=int, default=50000)
+    args = parser.parse_args()
+
+    token = create_access_token(data={"sub": str(uuid4()), "token_version": 1})
+
+    uncached = timeit.timeit(lambda: verify_token(token), number=args.iterations)
+
+    token_cache.clear()
+    verify_token_cached(token)  # first request populates the cache
+    cached = timeit.timeit(lambda: verify_token_cached(token), number=args.iterations)
+
+    per_uncached = uncached / args.iterations * 1e6
+    per_cached = cached / args.iterations * 1e6
+    print(f"iterations            : {args.iterations}")
+    print(f"decode + claim checks : {per_uncached:8.2f} us/request")
+    print(f"verified token cache  : {per_cached:8.2f} us/request")
+    print(f"speedup               : {per_uncached / per_cached:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Measure argon2 hash latency on this machine and recommend cost parameters.
+
+Run it on the same instance type / CPU limits the pods get:
+
+    python scripts/calibrate_argon2.py --target-ms 50
+
+The printed ARGON2_* values can be copied straight into the .env file.
+Existing hashes keep working and are upgraded on the next successful login.
+"""
+import argparse
+import os
+import statistics
+import time
+
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+SAMPLE_PASSWORD = "Calibrate#Passw0rd"
+
+
+def measure_ms(time_cost: int, memory_cost: int, parallelism: int, samples: int) -> float:
+    """Median wall time of a single hash in milliseconds."""
+    hasher = Argon2Hasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    hasher.hash(SAMPLE_PASSWORD)  # warm up
+
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.hash(SAMPLE_PASSWORD)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(target_ms: float, memory_cost: int, min_memory_cost: int, parallelism: int, max_time_cost: int, samples: int) -> tuple[int, int, float]:
+    """
+    Keep memory as high as the budget allows, then spend the rest of the
+    target on iterations. Returns (time_cost, memory_cost, measured_ms).
+    """
+    # t=1 already too slow -> give memory back until it fits
+    latency = measure_ms(1, memory_cost, parallelism, samples)
+    print(f"t=1 m={memory_cost}KiB p={parallelism} -> {latency:.1f} ms")
+    while latency > target_ms and memory_cost // 2 >= min_memory_cost:
+        memory_cost //= 2
+        latency = measure_ms(1, memory_cost, parallelism, samples)
+        print(f"t=1 m={memory_cost}KiB p={parallelism} -> {latency:.1f} ms")
+
+    time_cost = 1
+    while time_cost < max_time_cost:
+        candidate = measure_ms(time_cost + 1, memory_cost, parallelism, samples)
+        print(f"t={time_cost + 1} m={memory_cost}KiB p={parallelism} -> {candidate:.1f} ms")
+        if candidate > target_ms:
+            break
+        time_cost += 1
+        latency = candidate
+
+    return time_cost, memory_cost, latency
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recommend argon2 parameters for a latency target")
+    parser.add_argument("--target-ms", type=float, default=50.0, help="Wanted hash latency per login")
+    parser.add_argument("--memory-kib", type=int, default=65536, help="Starting memory cost in KiB")
+    parser.add_argument("--min-memory-kib", type=int, default=19456, help="Never recommend less memory than this (OWASP minimum)")
+    parser.add_argument("--parallelism", type=int, default=min(4, os.cpu_count() or 1), help="Argon2 lanes")
+    parser.add_argument("--max-time-cost", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=5, help="Hashes measured per candidate")
+    args = parser.parse_args()
+
+    time_cost, memory_cost, latency = calibrate(
+        target_ms=args.target_ms,
+        memory_cost=args.memory_kib,
+        min_memory_cost=args.min_memory_kib,
+        parallelism=args.parallelism,
+        max_time_cost=args.max_time_cost,
+        samples=args.samples,
+    )
+
+    if latency > args.target_ms:
+        print(f"\nWARNING: minimum parameters still take {latency:.1f} ms (> {args.target_ms} ms target)")
+
+    print(f"\nRecommended for ~{args.target_ms:.0f} ms ({latency:.1f} ms measured):")
+    print(f"ARGON2_TIME_COST={time_cost}")
+    print(f"ARGON2_MEMORY_COST={memory_cost}")
+    print(f"ARGON2_PARALLELISM={args.parallelism}")
+
+
+if __name__ == "__main__":
+    main()